@@ -0,0 +1,123 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _run_starts(dates: np.ndarray) -> np.ndarray:
+    """Returns the index of the first of every run of equal dates in a sorted array, in one linear pass."""
+    return np.flatnonzero(np.concatenate([[True], dates[1:] != dates[:-1]])[:len(dates)])
+
+
+def unique_sorted(dates: np.ndarray) -> np.ndarray:
+    """Returns the distinct dates of an already sorted array."""
+    return dates[_run_starts(dates)]
+
+
+def merge_calendars(dates: Sequence[np.ndarray], join_method: str) -> np.ndarray:
+    """
+    Returns the calendar the assets are aligned on: every date of any asset ('outer'), the dates all the assets share
+    ('inner'), or the dates of the first ('left') / last ('right') asset.
+
+    Every array must be sorted. Their concatenation is then k sorted runs, which a stable sort (timsort) merges like a
+    k-way merge, in O(n log k) - and the dates shared by all k assets are the ones appearing k times in a row.
+
+    :param dates: the sorted datetime64 array of every asset
+    :param join_method: the join method (left, right, inner, outer)
+    """
+    if join_method == 'left':
+        return unique_sorted(dates[0])
+    if join_method == 'right':
+        return unique_sorted(dates[-1])
+    if join_method not in ('inner', 'outer'):
+        raise ValueError(f"Unsupported join method: {join_method}")
+
+    runs = [unique_sorted(asset_dates) for asset_dates in dates]
+    merged = np.sort(np.concatenate(runs), kind='stable')
+    starts = _run_starts(merged)
+    if join_method == 'outer':
+        return merged[starts]
+    counts = np.diff(np.append(starts, len(merged)))
+    return merged[starts[counts == len(runs)]]
+
+
+def asof_values(
+        dates: np.ndarray,
+        values: np.ndarray,
+        calendar: np.ndarray,
+        ffill_days: int = 0,
+        last_seen: Optional[Tuple[np.datetime64, float]] = None
+) -> np.ndarray:
+    """
+    As-of join of one asset on the calendar: each calendar date takes the asset's price of that date, or else its
+    latest earlier price if that one is at most `ffill_days` old - NaN otherwise. Of duplicated dates, the last row
+    wins.
+
+    :param dates: the asset's sorted datetime64 dates
+    :param values: the asset's price on each date
+    :param calendar: the sorted dates to align on
+    :param ffill_days: how many days a price may be carried forward (0 = exact matches only)
+    :param last_seen: the (date, price) of the asset's last row before `dates`, when its rows are aligned in chunks
+    """
+    if last_seen is not None:
+        dates = np.concatenate([np.array([last_seen[0]], dtype=dates.dtype), dates])
+        values = np.concatenate([[last_seen[1]], values])
+    if len(dates) == 0:
+        return np.full(len(calendar), np.nan)
+
+    # index of the asset's last row on or before each calendar date (-1 = none yet)
+    positions = np.searchsorted(dates, calendar, side='right') - 1
+    found = positions >= 0
+    positions = np.maximum(positions, 0)
+    fresh = found & (calendar - dates[positions] <= np.timedelta64(ffill_days, 'D'))
+    return np.where(fresh, values[positions], np.nan)
+
+
+def align(
+        dates: Sequence[np.ndarray],
+        values: Sequence[np.ndarray],
+        join_method: str,
+        ffill_days: int = 0,
+        last_seen: Sequence[Optional[Tuple[np.datetime64, float]]] = None,
+        end: Optional[np.datetime64] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aligns any number of assets - each given as sorted date & price arrays - on one calendar (see `merge_calendars`),
+    forward-filling each asset's prices for up to `ffill_days` (see `asof_values`). Assets with different trading
+    calendars (ex: crypto trading 7 days a week, metals 5) can then be aligned on every day, with the weekend taking
+    Friday's price.
+
+    With forward-filling, an inner join keeps every date on which all the assets have a price - their own, or one
+    carried forward - up to `end`: the outer calendar, trimmed to the range the assets share.
+
+    :param last_seen: the (date, price) of every asset's last row aligned so far (or None) - to forward-fill across
+                      chunks when the rows are aligned chunk by chunk
+    :param end: the last date of a forward-filled inner join - defaults to the earliest last date of the assets when
+                they are aligned whole (without `last_seen`)
+    :return: (calendar, prices) - the aligned dates, and a (n_dates x n_assets) float array of prices
+    """
+    fill_inner = join_method == 'inner' and ffill_days > 0
+    calendar = merge_calendars(dates, 'outer' if fill_inner else join_method)
+    if last_seen is None:
+        if end is None:
+            end = min((asset_dates[-1] for asset_dates in dates if len(asset_dates)), default=None)
+        last_seen = [None] * len(dates)
+    if fill_inner and end is not None:
+        calendar = calendar[calendar <= end]
+
+    prices = np.empty((len(calendar), len(dates)))
+    for i, (asset_dates, asset_values, asset_last_seen) in enumerate(zip(dates, values, last_seen)):
+        prices[:, i] = asof_values(asset_dates, asset_values, calendar, ffill_days, asset_last_seen)
+
+    if fill_inner:
+        shared = ~np.isnan(prices).any(axis=1)
+        calendar, prices = calendar[shared], prices[shared]
+    return calendar, prices
+
+
+def last_rows(dates: Sequence[np.ndarray], values: Sequence[np.ndarray],
+              last_seen: Sequence[Optional[Tuple[np.datetime64, float]]] = None) -> List:
+    """Returns the (date, price) of every asset's last row - or the previous one, for assets without any new rows."""
+    if last_seen is None:
+        last_seen = [None] * len(dates)
+    return [(asset_dates[-1], asset_values[-1]) if len(asset_dates) else previous
+            for asset_dates, asset_values, previous in zip(dates, values, last_seen)]
@@ -0,0 +1,303 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import ffill_days as config_ffill_days, weekly_investment as config_weekly_investment
+from cpi import CPIStore
+from export import open_table, write_chunks
+from utils import DataImport, RunSimulator, read_price_csv
+
+# columns of the consolidated result table - one row per asset of every pair
+COLUMNS = ['Pair', 'Asset', 'Start', 'End', 'Years', 'Total Invested', 'Units', 'Ending Value', 'Nominal ROI',
+           'Real ROI', 'Correlation', 'Slope']
+
+# the shared price arrays (and run settings) of a worker process - set once per process by `_attach`
+_worker = {}
+
+
+class SharedPrices:
+    """
+    The daily closing prices of every asset, loaded once into two shared-memory blocks - every asset's dates, then
+    every asset's prices, one asset after the other - which the worker processes map as NumPy arrays without copying.
+
+    :param series: the sorted (dates, closes) arrays of every asset, by asset name
+    """
+
+    def __init__(self, series: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> None:
+        self.asset_names = list(series)
+        self.offsets = np.concatenate([[0], np.cumsum([len(dates) for dates, _ in series.values()])]).astype(np.int64)
+        n_rows = int(self.offsets[-1])
+
+        # 8 bytes per row in both blocks: datetime64[ns] dates & float64 prices
+        self._blocks = [shared_memory.SharedMemory(create=True, size=max(n_rows * 8, 1)) for _ in range(2)]
+        dates, closes = self.views(self._blocks, n_rows)
+        for i, (asset_dates, asset_closes) in enumerate(series.values()):
+            dates[self.offsets[i]:self.offsets[i + 1]] = asset_dates
+            closes[self.offsets[i]:self.offsets[i + 1]] = asset_closes
+
+    @property
+    def handle(self) -> tuple:
+        """What a worker needs to map the prices (see `_attach`) - the block names, the asset names & offsets."""
+        return self._blocks[0].name, self._blocks[1].name, self.asset_names, self.offsets
+
+    @staticmethod
+    def views(blocks: Sequence[shared_memory.SharedMemory], n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (dates, closes) arrays backed by the shared-memory blocks."""
+        return (np.ndarray(n_rows, dtype='datetime64[ns]', buffer=blocks[0].buf),
+                np.ndarray(n_rows, dtype=np.float64, buffer=blocks[1].buf))
+
+    def close(self) -> None:
+        """Frees the shared-memory blocks."""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+    def __enter__(self) -> 'SharedPrices':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _attach(handle: tuple, weekly_investment: float, ffill_days: int) -> None:
+    """Maps the shared prices into this (worker) process, and keeps the run settings - the pool's initializer."""
+    dates_name, closes_name, asset_names, offsets = handle
+    blocks = [shared_memory.SharedMemory(name=name) for name in (dates_name, closes_name)]
+    dates, closes = SharedPrices.views(blocks, int(offsets[-1]))
+
+    _worker.update({
+        'blocks': blocks,
+        'dates': dates,
+        'closes': closes,
+        'rows': {asset: (offsets[i], offsets[i + 1]) for i, asset in enumerate(asset_names)},
+        'cpi_store': CPIStore(),
+        'weekly_investment': weekly_investment,
+        'ffill_days': ffill_days
+    })
+
+
+def _simulate_pair(pair: Tuple[str, str]) -> List[tuple]:
+    """
+    Runs the report of one asset pair, like importer.py does for the pair in config.py: inner join of the daily
+    prices, mean weekly closes, DCA simulation, ROI (real ROI left empty when the CPI is unknown) and correlation.
+    """
+    closes = []
+    for asset in pair:
+        start, stop = _worker['rows'][asset]
+        # views of the shared arrays - no copy of the prices
+        closes.append(pd.Series(_worker['closes'][start:stop], name=asset, copy=False,
+                                index=pd.DatetimeIndex(_worker['dates'][start:stop], name='Date')))
+
+    # the range both assets cover (see `DataImport.determine_date_range`)
+    start_date = max(series.index[0] for series in closes).date()
+    end_date = min(series.index[-1] for series in closes).date()
+    years = round((end_date - start_date).days / 365, 2)
+    if years < 1:
+        raise ValueError(f"less than 1 year of shared price history ({max((end_date - start_date).days, 0)} days)")
+
+    weekly = DataImport.resample_weekly(DataImport.align_closes(closes, 'inner', _worker['ffill_days']))
+    if weekly.isna().all().any():
+        raise ValueError("no dates in common")
+    piv = pd.DataFrame(weekly.to_numpy(dtype=float), columns=[f'{asset} Close' for asset in pair])
+    piv.insert(0, 'Date', weekly.index.to_numpy())
+
+    cpi_starting, cpi_ending = _worker['cpi_store'].lookup_dates([start_date, end_date])
+    simulator = RunSimulator(piv, list(pair), _worker['weekly_investment'], cpi_starting=cpi_starting,
+                             cpi_ending=cpi_ending)
+    simulator.rolling_totals()
+    correl, slope = RunSimulator.correlation(piv, list(pair))
+
+    units, value = simulator.total_asset_purchased(), simulator.ending_investment_value()
+    nominal_roi = simulator.nominal_roi()
+    inflation_known = not np.isnan([cpi_starting, cpi_ending]).any()
+    real_roi = simulator.real_roi() if inflation_known else pd.Series(np.nan, index=list(pair))
+    return [(f'{pair[0]} vs {pair[1]}', asset, start_date, end_date, years, simulator.total_usd_invested(),
+             units[asset], value[asset], nominal_roi[asset], real_roi[asset], correl, slope) for asset in pair]
+
+
+def _run_pairs(pairs: Sequence[Tuple[str, str]]) -> Tuple[List[tuple], List[Tuple[str, str]]]:
+    """Runs a batch of pairs in a worker - a pair that fails is reported back as skipped, the others still run."""
+    rows, skipped = [], []
+    for pair in pairs:
+        try:
+            rows += _simulate_pair(pair)
+        except (ValueError, KeyError, TypeError) as e:
+            skipped.append((f'{pair[0]} vs {pair[1]}', str(e)))
+        except SystemExit:
+            # the simulator exits on data it can't use - the error it logged says why
+            skipped.append((f'{pair[0]} vs {pair[1]}', "the simulation failed (see the error above)"))
+    return rows, skipped
+
+
+class BatchScheduler:
+    """
+    Runs the report of many asset pairs (by default every pair of every .csv in the directory) in one go: each file is
+    read once, into shared memory (see `SharedPrices`), and the pairs are simulated across a process pool whose
+    workers map the prices without copying them. A malformed file, or a pair that can't be simulated (ex: less than
+    a year of shared history), is reported and skipped instead of stopping the batch. The results of all the pairs
+    come out as one table.
+
+    :param main_directory: the directory holding one .csv file per asset
+    :param asset_names: the assets to load - defaults to every .csv in the directory, each named after its file
+                        (ex: 'btc_v_d' for btc_v_d.csv)
+    :param weekly_investment: the static dollar amount invested weekly
+    :param ffill_days: how many days a price is carried forward when aligning a pair (see `DataImport`)
+    :param max_workers: process pool size (defaults to the number of CPUs) - 1 runs every pair in this process
+    """
+
+    # pairs sent to a worker at a time
+    batch_size = 64
+
+    def __init__(
+            self,
+            main_directory: str,
+            asset_names: Sequence[str] = None,
+            weekly_investment: float = config_weekly_investment,
+            ffill_days: int = config_ffill_days,
+            max_workers: int = None
+    ) -> None:
+        self.main_directory = main_directory
+        self.asset_names = list(asset_names) if asset_names is not None else sorted(
+            _file[:-len('.csv')] for _file in os.listdir(main_directory) if _file.endswith('.csv')
+        )
+        self.weekly_investment = weekly_investment
+        self.ffill_days = ffill_days
+        self.max_workers = max_workers or os.cpu_count()
+        # (file or pair, reason) of everything the last run skipped
+        self.skipped: List[Tuple[str, str]] = []
+
+    def _skip(self, name: str, reason: str) -> None:
+        print(f"Warning: Skipped {name} - {reason}.")
+        self.skipped.append((name, reason))
+
+    def _read(self, asset: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Returns the sorted (dates, closes) of an asset's .csv - None (and a warning) if it is malformed."""
+        file_path = os.path.join(self.main_directory, f'{asset}.csv')
+        try:
+            asset_df = read_price_csv(file_path)
+        except (ValueError, TypeError, OSError) as e:
+            self._skip(f'{asset}.csv', f"it couldn't be parsed ({e})")
+            return None
+
+        if asset_df is None:
+            self._skip(f'{asset}.csv', "it lacks a 'Date' or 'Close' column")
+        elif asset_df.empty:
+            self._skip(f'{asset}.csv', "it has no price rows")
+        elif not pd.api.types.is_numeric_dtype(asset_df['Close']):
+            self._skip(f'{asset}.csv', "its 'Close' column isn't numeric")
+        elif asset_df['Date'].isna().any():
+            self._skip(f'{asset}.csv', "some of its rows have no date")
+        else:
+            order = np.argsort(asset_df['Date'].to_numpy(), kind='stable')
+            return (asset_df['Date'].to_numpy(dtype='datetime64[ns]')[order],
+                    asset_df['Close'].to_numpy(dtype=float)[order])
+        return None
+
+    def load(self, asset_names: Sequence[str] = None) -> SharedPrices:
+        """
+        Reads every asset's .csv once (skipping the malformed ones), into shared memory.
+
+        :param asset_names: the assets to read - defaults to every asset of the scheduler
+        """
+        self.skipped = []
+        series = {}
+        for asset in (self.asset_names if asset_names is None else asset_names):
+            prices = self._read(asset)
+            if prices is not None:
+                series[asset] = prices
+        return SharedPrices(series)
+
+    def iter_run(self, pairs: Sequence[Tuple[str, str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yields the results of `run`, batch by batch of pairs, as the workers finish them.
+
+        :param pairs: the asset pairs to simulate - defaults to every pair of the loaded assets
+        """
+        # only the assets of the requested pairs are read
+        asset_names = None
+        if pairs is not None:
+            asset_names = sorted({asset for pair in pairs for asset in pair} & set(self.asset_names))
+        with self.load(asset_names) as prices:
+            if pairs is None:
+                pairs = list(itertools.combinations(prices.asset_names, 2))
+            loaded = set(prices.asset_names)
+            for pair in pairs:
+                for asset in set(pair) - loaded:
+                    self._skip(f'{pair[0]} vs {pair[1]}', f"there is no valid price file for {asset}")
+            pairs = [tuple(pair) for pair in pairs if set(pair) <= loaded]
+            batches = [pairs[offset:offset + self.batch_size] for offset in range(0, len(pairs), self.batch_size)]
+
+            try:
+                if self.max_workers == 1:
+                    _attach(prices.handle, self.weekly_investment, self.ffill_days)
+                    yield from self._frames(map(_run_pairs, batches))
+                else:
+                    with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_attach,
+                                             initargs=(prices.handle, self.weekly_investment, self.ffill_days)) as pool:
+                        yield from self._frames(pool.map(_run_pairs, batches))
+            finally:
+                # the arrays this process mapped itself (if any) go before the blocks are freed
+                _worker.clear()
+
+    def _frames(self, results) -> Iterator[pd.DataFrame]:
+        for rows, skipped in results:
+            for name, reason in skipped:
+                self._skip(name, reason)
+            yield pd.DataFrame(rows, columns=COLUMNS)
+
+    def run(self, pairs: Sequence[Tuple[str, str]] = None) -> pd.DataFrame:
+        """
+        Simulates every pair, and returns the consolidated result table - one row per asset of every pair, in pair
+        order (pairs that were skipped are listed in `skipped`).
+
+        :param pairs: the asset pairs to simulate - defaults to every pair of the loaded assets
+        """
+        frames = list(self.iter_run(pairs))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+    def export(self, output_path: str, pairs: Sequence[Tuple[str, str]] = None, fmt: str = None) -> int:
+        """
+        Same as `run`, but every batch of results is written to `output_path` (.csv, .parquet or .arrow) as soon as a
+        worker finishes it.
+
+        :return: the number of rows written
+        """
+        with open_table(output_path, fmt) as writer:
+            return write_chunks(writer, self.iter_run(pairs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the DCA report of every asset pair of a directory of .csv's.")
+    parser.add_argument('--directory', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory holding one price .csv per asset")
+    parser.add_argument('--pairs', nargs='+', metavar='ASSET1:ASSET2',
+                        help="asset pairs to simulate (assets are named after their .csv) - defaults to every pair")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (defaults to the number of CPUs)")
+    parser.add_argument('--output', help="write the result table to this .csv / .parquet / .arrow file")
+    args = parser.parse_args()
+
+    pairs = None
+    if args.pairs:
+        pairs = [tuple(pair.split(':')) for pair in args.pairs]
+        if any(len(pair) != 2 for pair in pairs):
+            parser.error("pairs are written as ASSET1:ASSET2, ex: btc_v_d:xau_d")
+
+    scheduler = BatchScheduler(args.directory, max_workers=args.workers)
+    if args.output:
+        n_rows = scheduler.export(args.output, pairs)
+        print(f"{n_rows} rows written to {args.output}")
+    else:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(scheduler.run(pairs).to_string(index=False))
+    if scheduler.skipped:
+        print(f"{len(scheduler.skipped)} files or pairs skipped.")
+
+
+if __name__ == '__main__':
+    main()
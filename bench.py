@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from sys import exit
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from config import asset1_name, asset2_name
+from utils import DataImport, RunSimulator
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'bench_baseline.json')
+STAGES = ['csv import', 'merge', 'resample', 'rolling totals', 'roi', 'correlation', 'rolling correlation']
+
+
+def generate_price_csv(
+        file_path: str,
+        n_rows: int,
+        weekdays_only: bool = False,
+        start: str = '2000-01-03',
+        seed: int = 0
+) -> None:
+    """
+    Writes a synthetic price-history .csv laid out like the sample files (Date, Open, High, Low, Close, Volume).
+    Prices follow a geometric random walk. Bars are daily for small files, then hourly or by the minute, so that 10^3 to
+    10^7 rows still span a realistic date range. With `weekdays_only`, weekend bars are left out (a metals-style
+    calendar), while the crypto-style calendar trades 7 days a week - so two files never line up row for row.
+    """
+    freq = 'D' if n_rows <= 10_000 else 'h' if n_rows <= 200_000 else 'min'
+    # weekend bars are generated, then dropped, so both calendars cover the same date range
+    n_generated = int(np.ceil(n_rows * 7 / 5)) if weekdays_only else n_rows
+    dates = pd.date_range(start, periods=n_generated, freq=freq)
+    if weekdays_only:
+        dates = dates[dates.dayofweek < 5][:n_rows]
+
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02 if freq == 'D' else 0.002, len(dates))))
+    spread = np.abs(rng.normal(0, 0.01, len(dates))) * close
+
+    pd.DataFrame({
+        'Date': dates.strftime('%m/%d/%Y' if freq == 'D' else '%m/%d/%Y %H:%M'),
+        'Open': np.round(close + rng.normal(0, 0.5, len(dates)) * spread, 2),
+        'High': np.round(close + spread, 2),
+        'Low': np.round(close - spread, 2),
+        'Close': np.round(close, 2),
+        'Volume': rng.integers(0, 100_000, len(dates))
+    }).to_csv(file_path, index=False)
+
+
+def _measure(func: Callable, repeat: int) -> Dict[str, float]:
+    """Returns the best wall time of `repeat` runs of func, and its peak traced memory (measured in a separate run)."""
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(seconds), 'peak_mb': peak / 2**20}
+
+
+def run_stages(data_directory: str, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """Times each stage of the report pipeline on the .csv files in data_directory, feeding each stage the last."""
+    run = DataImport(data_directory, [asset1_name, asset2_name], use_cache=False)
+
+    results = {}
+    state = {}
+
+    def csv_import():
+        # the un-memoized loader, so every repeat really reads the files
+        state['imported'] = run._import_price_action_csv()
+
+    def merge():
+        closes = [df.set_index('Date')['Close'].rename(asset) for asset, df in zip(run.asset_names, state['imported'])]
+        state['aligned'] = DataImport.align_closes(closes, 'inner')
+
+    def resample():
+        weekly = DataImport.resample_weekly(state['aligned'])
+        df = pd.DataFrame(weekly.to_numpy(dtype=float), columns=[f'{asset} Close' for asset in run.asset_names])
+        df.insert(0, 'Date', weekly.index.to_numpy())
+        state['df'] = df
+
+    def rolling_totals():
+        state['simulator'] = RunSimulator(state['df'], run.asset_names, 50)
+        state['simulator'].rolling_totals()
+
+    def roi():
+        simulator = state['simulator']
+        simulator.ending_investment_value()
+        simulator.total_asset_purchased()
+        simulator.nominal_roi()
+        simulator.real_roi()
+
+    def correlation():
+        RunSimulator.correlation_matrix(state['df'], run.asset_names)
+
+    def rolling_correlation():
+        RunSimulator.rolling_correlation(state['df'], 52, run.asset_names)
+
+    RunSimulator.cpi_starting, RunSimulator.cpi_ending = 0.0, 0.0
+    for stage, func in zip(STAGES, [csv_import, merge, resample, rolling_totals, roi, correlation,
+                                       rolling_correlation]):
+        results[stage] = _measure(func, repeat)
+    return results
+
+
+def compare(
+        results: Dict[str, Dict],
+        baseline: Dict[str, Dict],
+        tolerance: float,
+        noise_floor: float = 0.005
+) -> List[str]:
+    """
+    Returns a message for every stage that got slower than its baseline by more than `tolerance` (ex: 0.25 = 25%).
+    Differences below `noise_floor` seconds are ignored, so the fastest stages don't get flagged on timer noise.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, measured in stages.items():
+            expected = baseline.get(size, {}).get(stage)
+            if expected and measured['seconds'] > expected['seconds'] * (1 + tolerance) + noise_floor:
+                regressions.append(f"{stage} @ {size} rows: {measured['seconds']:.4f}s "
+                                   f"(baseline {expected['seconds']:.4f}s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks each stage of the DCA report on synthetic price data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help="rows per synthetic .csv (up to 10^7)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (the best one is kept)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="slowdown vs. baseline flagged as a regression")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline .json file")
+    parser.add_argument('--save-baseline', action='store_true', help="save these results as the new baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as data_directory:
+            generate_price_csv(os.path.join(data_directory, f'{asset1_name}_synthetic.csv'), size, seed=1)
+            generate_price_csv(os.path.join(data_directory, f'{asset2_name}_synthetic.csv'), size, True, seed=2)
+            results[str(size)] = run_stages(data_directory, args.repeat)
+
+        print(f"\n{size:,} rows per asset:")
+        for stage, measured in results[str(size)].items():
+            print(f"  {stage:<20} {measured['seconds']:>10.4f}s {measured['peak_mb']:>10.1f} MB peak")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline yet - run again with --save-baseline to record one.")
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("\nSlower than baseline:\n  " + "\n  ".join(regressions))
+        exit(1)
+    print("\nNo stage is slower than its baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Returns the sha256 hex digest of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def array_hash(*arrays: np.ndarray) -> str:
+    """Returns the sha256 hex digest of the contents (dtype, shape and data) of NumPy arrays."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f'{array.dtype.str}{array.shape}'.encode())
+        digest.update(array.view(np.uint8) if array.size else b'')
+    return digest.hexdigest()
+
+
+class PriceCache:
+    """
+    Binary cache of the (Date, Close) series parsed from a price-history .csv, kept next to it in a `<file>.cache`
+    directory as two .npy arrays. Warm starts memory-map the arrays instead of parsing the .csv again.
+
+    Entries are keyed by the .csv's size, mtime and content hash: a matching size & mtime is trusted as is, a new mtime
+    falls back to comparing the content hash, and anything else marks the entry as stale so it gets rebuilt.
+
+    :param csv_path: path of the price-history .csv file
+    """
+
+    def __init__(self, csv_path: str) -> None:
+        self.csv_path = csv_path
+        self.cache_dir = f'{csv_path}.cache'
+        self.meta_path = os.path.join(self.cache_dir, 'meta.json')
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta: dict) -> None:
+        # the meta file is written last, and atomically - it is what marks the arrays as complete
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def content_hash(self) -> Optional[str]:
+        """Returns the content hash of the .csv, as of the cached entry (None if nothing is cached)."""
+        meta = self._read_meta()
+        return meta['sha256'] if meta else None
+
+    def is_fresh(self) -> bool:
+        """Returns True if the cached arrays still match the .csv file on disk."""
+        meta = self._read_meta()
+        if meta is None:
+            return False
+
+        stat = os.stat(self.csv_path)
+        if stat.st_size != meta['size']:
+            return False
+        if stat.st_mtime_ns == meta['mtime_ns']:
+            return True
+
+        # the file was touched - it is only stale if its content changed too
+        if file_hash(self.csv_path) != meta['sha256']:
+            return False
+        self._write_meta({**meta, 'mtime_ns': stat.st_mtime_ns})
+        return True
+
+    def load(self) -> Optional[pd.DataFrame]:
+        """Returns the cached (Date, Close) DataFrame, memory-mapped from disk - None if the cache is missing/stale."""
+        if not self.is_fresh():
+            return None
+        try:
+            dates = np.load(os.path.join(self.cache_dir, 'date.npy'), mmap_mode='r')
+            closes = np.load(os.path.join(self.cache_dir, 'close.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        return pd.DataFrame({'Date': pd.Series(dates, copy=False), 'Close': pd.Series(closes, copy=False)}, copy=False)
+
+    def store(self, df: pd.DataFrame, content: bytes, mtime_ns: int) -> None:
+        """
+        Caches the 'Date' and 'Close' columns of a freshly parsed price-history DataFrame.
+
+        :param content: the bytes of the .csv the DataFrame was parsed from - the entry is keyed by their size & hash,
+                        so rows appended to the file since it was read make the entry stale
+        :param mtime_ns: the file's mtime, taken before `content` was read
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        np.save(os.path.join(self.cache_dir, 'date.npy'), df['Date'].to_numpy())
+        np.save(os.path.join(self.cache_dir, 'close.npy'), df['Close'].to_numpy(dtype=float))
+        self._write_meta({'size': len(content), 'mtime_ns': mtime_ns, 'sha256': hashlib.sha256(content).hexdigest()})
+
+
+class ResultCache:
+    """
+    Content-addressed cache of computed results (ex: a whole report's simulation, or the cells of a sweep), in two
+    tiers: an in-memory LRU of the `max_entries` most recently used results, over a directory of pickles whose least
+    recently used entries are evicted once it outgrows `max_disk_bytes`.
+
+    Results are kept pickled, in both tiers: every `get` returns its own copy, so a caller changing a result can't
+    alter the cached one (or another thread's). The cache can be shared by threads, and its directory by processes.
+
+    Keys are hashes of everything a result depends on - the price data itself (see `DataImport.price_hash`) plus the
+    simulation parameters - so a changed .csv gives new keys, and a stale result can never be returned. Entries built
+    on old data just age out of the cache.
+
+    :param cache_dir: the directory of the disk tier - None keeps the results in memory only
+    :param max_entries: the number of results kept in memory
+    :param max_disk_bytes: the size the disk tier is trimmed to
+    """
+
+    def __init__(self, cache_dir: str = None, max_entries: int = 64, max_disk_bytes: int = 256 * 2 ** 20) -> None:
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        # pickled results, least recently used first
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # size of the disk tier as of its last scan, plus what this process wrote since - None until the first scan
+        self._disk_bytes = None
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Returns the cache key of a result - the hash of everything it depends on (JSON-able values, or strings)."""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self.cache_dir is not None and os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Any:
+        """Returns a copy of the cached result of `key` (None if it isn't cached) - a disk hit is kept in memory too."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is None:
+            if self.cache_dir is None:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # the modification time orders the disk tier by last use
+                os.utime(path)
+            except OSError:
+                return None
+            self._remember(key, data)
+
+        try:
+            return pickle.loads(data)
+        except (ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Caches (a copy of) the result of `key`, in memory and on disk."""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, data)
+        if self.cache_dir is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # written to a temporary file of its own first, so concurrent writers of the same key don't clash, and a
+        # concurrent reader never sees half an entry
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # the directory is only scanned when this process may have pushed it over its size
+        with self._lock:
+            scan = self._disk_bytes is None or self._disk_bytes + len(data) > self.max_disk_bytes
+            if not scan:
+                self._disk_bytes += len(data)
+        if scan:
+            self._evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Returns the cached result of `key`, computing (and caching) it first if needed."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _evict(self) -> None:
+        """Removes the least recently used entries from disk until the disk tier fits in `max_disk_bytes`."""
+        entries = []
+        for _file in os.listdir(self.cache_dir):
+            if _file.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, _file))
+                except OSError:
+                    continue  # evicted by another process meanwhile
+                entries.append((stat.st_mtime_ns, stat.st_size, _file))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, _file in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, _file))
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
@@ -2,8 +2,62 @@
 asset1_name = 'btc'
 asset2_name = 'xau'
 
+# Every asset to import & simulate - add more names to compare a whole universe of assets in one run
+asset_names = [asset1_name, asset2_name]
+
 # Enter desired weekly investment amount in USD:
 weekly_investment = 50
 
+# exact accounting: prices & cash are counted in whole cents and units in whole fractions of a unit (int64), so the
+# weekly purchases aren't rounded to 2 decimals and nothing drifts
+exact_accounting = False
+
+# decimals each asset's units are counted in, in exact accounting (8 = satoshis) - assets not listed here use 8
+unit_decimals = {'btc': 8, 'xau': 6}
+
+# decimals each asset's prices are counted in, in exact accounting - assets not listed here use 2 (cents). Raise it for
+# assets priced in fractions of a cent, whose prices would otherwise round to 0 (ex: {'shib': 8})
+price_decimals = {}
+
 # desired smoothing in the chart
 moving_average_weeks = int(52/2)  # 6 month moving average
+
+# only read the rows appended to the .csv files since the last run (the weekly state is kept in weekly_state.json)
+incremental_updates = False
+
+# read the price .csv files in chunks of this many rows, straight into weekly averages - bounds memory for minute or
+# hourly files spanning years (None reads each file whole)
+chunk_rows = None
+
+# days an asset's last price is carried forward onto dates it has no price for, when aligning assets with different
+# trading calendars (ex: 3 covers the weekends of a 5-day market next to a 7-day one) - 0 only aligns same-day prices
+ffill_days = 0
+
+# cache the results of the report & sweeps (keyed by the content of the .csv files and the parameters), so repeated
+# runs on unchanged data return instantly - kept in memory and in the .result_cache directory
+result_cache = True
+
+# size (in MB) the .result_cache directory is trimmed to, dropping the least recently used results first
+result_cache_mb = 256
+
+# record the wall time, rows processed and memory delta of each pipeline stage (adds no cost while False)
+profile_run = False
+
+# how importer.py reports its results: 'text' (printed summary), 'json' (machine-readable) or 'both'
+report_format = 'text'
+
+# file the JSON report is written to (None prints it instead)
+report_path = None
+
+# number of block-bootstrapped price paths used for the spread (percentile bands) of the ending values - 0 turns it off
+monte_carlo_paths = 0
+
+# seed of the bootstrapped paths, for reproducible bands (None draws new paths on every run)
+monte_carlo_seed = None
+
+# also export the weekly pivot, the simulation results & the raw prices: 'xlsx' (one workbook, for small outputs),
+# 'csv', 'parquet' or 'arrow' (one file per table, written in chunks) - None exports nothing
+export_format = None
+
+# also chart the ROI of every (start week, end week) DCA window as a heatmap
+rolling_entry_heatmap = False
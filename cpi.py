@@ -0,0 +1,157 @@
+import argparse
+import logging
+import os
+from sys import exit
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+# month names & abbreviations used by the published CPI tables ('Jan', 'June', 'Sept', ...) - matched exactly, so
+# that columns like 'Dec-Dec' (the annual % change) aren't taken for a month
+MONTHS = {name: month for month, names in enumerate([
+    ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',), ('jun', 'june'),
+    ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'), ('oct', 'october'), ('nov', 'november'),
+    ('dec', 'december')], start=1) for name in names}
+
+CPI_URL = "https://www.usinflationcalculator.com/inflation/" \
+          "consumer-price-index-and-annual-percent-changes-from-1913-to-2008/"
+
+
+class CPIStore:
+    """
+    Local, on-disk store of the monthly US CPI series, so inflation can be worked out without a network connection.
+    The values sit in one dense array indexed by month, so a (year, month) lookup is O(1), and any number of dates can
+    be looked up with a single vectorized call.
+
+    :param path: the .csv file backing the store (Year, Month, CPI columns) - defaults to cpi_monthly.csv in the project
+    """
+
+    default_path = os.path.join(os.path.dirname(__file__), 'cpi_monthly.csv')
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path if path is not None else self.default_path
+        self.first_year = None
+        self.values = np.array([], dtype=float)
+
+        if os.path.exists(self.path):
+            self._load(pd.read_csv(self.path))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(~np.isnan(self.values)))
+
+    def _load(self, df: pd.DataFrame) -> None:
+        """Loads a long (Year, Month, CPI) DataFrame into the dense monthly array."""
+        df = df.dropna(subset=['CPI'])
+        years = df['Year'].to_numpy(dtype=int)
+        months = df['Month'].to_numpy(dtype=int)
+
+        self.first_year = int(years.min())
+        position = (years - self.first_year) * 12 + months - 1
+        self.values = np.full(position.max() + 1, np.nan)
+        self.values[position] = df['CPI'].to_numpy(dtype=float)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the store as a long DataFrame - one row per month with a known CPI."""
+        position = np.flatnonzero(~np.isnan(self.values))
+        return pd.DataFrame({
+            'Year': self.first_year + position // 12,
+            'Month': position % 12 + 1,
+            'CPI': self.values[position]
+        })
+
+    def save(self) -> None:
+        """Writes the store to disk."""
+        self.to_frame().to_csv(self.path, index=False)
+
+    def lookup(self, year: int, month: int) -> float:
+        """Returns the CPI of the given month, or NaN if the store doesn't hold it."""
+        if self.first_year is None:
+            return np.nan
+        position = (year - self.first_year) * 12 + month - 1
+        return float(self.values[position]) if 0 <= position < len(self.values) else np.nan
+
+    def lookup_dates(self, dates) -> np.ndarray:
+        """Returns the CPI of the month each date falls in (NaN where unknown), in one vectorized lookup."""
+        dates = pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(dates)))
+        if self.first_year is None:
+            return np.full(len(dates), np.nan)
+
+        position = (dates.year.to_numpy() - self.first_year) * 12 + dates.month.to_numpy() - 1
+        in_range = (position >= 0) & (position < len(self.values))
+        return np.where(in_range, self.values[np.clip(position, 0, len(self.values) - 1)], np.nan)
+
+    @staticmethod
+    def _wide_to_long(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converts a published CPI table (a 'Year' column, then one column per month) to (Year, Month, CPI) rows. Other
+        columns (ex: 'Avg', 'Dec-Dec') are left out - a month with more than one column is rejected.
+        """
+        month_columns = {col: MONTHS[str(col).strip().rstrip('.').lower()] for col in df.columns
+                         if str(col).strip().rstrip('.').lower() in MONTHS}
+        months = list(month_columns.values())
+        if not months:
+            raise ValueError("no month columns (Jan, Feb, ...)")
+        duplicated = sorted({col for col, month in month_columns.items() if months.count(month) > 1}, key=str)
+        if duplicated:
+            raise ValueError(f"ambiguous month columns: {', '.join(map(str, duplicated))}")
+        df = df[['Year', *month_columns]].melt(id_vars='Year', var_name='Month', value_name='CPI')
+        df['Month'] = df['Month'].map(month_columns)
+        return df
+
+    def merge(self, df: pd.DataFrame) -> None:
+        """
+        Adds monthly CPI values to the store (newer values win), then saves it to disk.
+        Accepts either a long (Year, Month, CPI) table, or a wide table with one column per month.
+        """
+        if 'CPI' not in df.columns:
+            df = self._wide_to_long(df)
+
+        df = df[['Year', 'Month', 'CPI']].apply(pd.to_numeric, errors='coerce').dropna()
+        combined = pd.concat([self.to_frame() if len(self) else None, df]) \
+            .drop_duplicates(subset=['Year', 'Month'], keep='last')
+
+        self._load(combined)
+        self.save()
+
+    def import_file(self, path: str) -> None:
+        """Imports monthly CPI values from a .csv file (long or wide layout, see `merge`) into the store."""
+        try:
+            self.merge(pd.read_csv(path, encoding='latin1'))
+        except (FileNotFoundError, KeyError, ValueError):
+            logging.exception(f"Couldn't import CPI values from {path}. The file needs a 'Year' column, plus either a "
+                              f"'Month' and 'CPI' column, or one column per month (Jan, Feb, ...).")
+            exit(1)
+
+    def import_from_web(self, url: str = CPI_URL) -> None:
+        """One-off download of the CPI table from usinflationcalculator.com into the store (needs network access)."""
+        # import/wrangle CPI table
+        df = pd.read_html(url)[0]
+        df.columns = df.iloc[1]
+        df = df.iloc[2:, :-4]
+        self.merge(df)
+
+
+def cpi_between(cpi_starting: Union[float, np.ndarray], cpi_ending: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Returns the inflation rate (%) between a starting and ending CPI, rounded to 1 decimal - 0 where either CPI is
+    unknown. Works on single values and on arrays of scenarios alike.
+    """
+    cpi_starting = np.asarray(cpi_starting, dtype=float)
+    cpi_ending = np.asarray(cpi_ending, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.round((cpi_ending - cpi_starting) / cpi_starting * 100, 1)
+    return np.where((cpi_starting > 0) & (cpi_ending > 0), rate, 0.0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Imports monthly CPI values into the local CPI store.")
+    parser.add_argument('source', nargs='?', help=".csv file to import (omit to download the table instead)")
+    args = parser.parse_args()
+
+    store = CPIStore()
+    if args.source:
+        store.import_file(args.source)
+    else:
+        store.import_from_web()
+    print(f"CPI store at {store.path} now holds {len(store)} months.")
@@ -0,0 +1,238 @@
+import logging
+import os
+from sys import exit
+from typing import Dict, Iterable, List, Union
+
+import pandas as pd
+
+# rows converted & written at a time - the memory an export takes doesn't grow with the table size
+EXPORT_CHUNK_ROWS = 100_000
+
+# rows an Excel sheet holds (header row included)
+EXCEL_MAX_ROWS = 1_048_576
+
+# file extension of each export format
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow', 'xlsx': '.xlsx'}
+
+
+def _pyarrow():
+    """Imports pyarrow on first use - it is only needed for the .parquet & .arrow exports."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        logging.error("Exporting to .parquet or .arrow needs pyarrow (`pip install pyarrow`) - or export to .csv.")
+        exit(1)
+    return pyarrow
+
+
+class TableWriter:
+    """
+    Writes one table to a file, chunk by chunk, in constant memory: each chunk is converted and written as soon as it
+    is handed over, so a table can be exported while it is still being produced (ex: a sweep, shard by shard).
+    Every chunk must have the columns of the first one.
+
+    :param path: the file written
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rows = 0
+
+    def write(self, frame: pd.DataFrame) -> None:
+        """Appends the rows of `frame` to the table."""
+        self._write(frame)
+        self.rows += len(frame)
+
+    def _write(self, frame: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Finishes the file."""
+
+    def __enter__(self) -> 'TableWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CSVWriter(TableWriter):
+    """.csv table - the header is written with the first chunk."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+
+    def _write(self, frame):
+        frame.to_csv(self._file, header=self.rows == 0, index=False)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter(TableWriter):
+    """.parquet table - every chunk becomes a row group, with the schema of the first chunk."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._pa = _pyarrow()
+        self._writer = None
+
+    def _table(self, frame: pd.DataFrame):
+        schema = self._writer.schema if self._writer is not None else None
+        return self._pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+    def _open(self, schema):
+        return self._pa.parquet.ParquetWriter(self.path, schema)
+
+    def _write(self, frame):
+        table = self._table(frame)
+        if self._writer is None:
+            self._writer = self._open(table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ArrowWriter(ParquetWriter):
+    """.arrow table, in the Arrow IPC file format - read back with `pd.read_feather` or `pyarrow.ipc.open_file`."""
+
+    def _open(self, schema):
+        return self._pa.ipc.new_file(self.path, schema)
+
+
+class ExcelWorkbook:
+    """
+    .xlsx workbook written with xlsxwriter's constant-memory mode: rows go to disk as they are written, one sheet after
+    the other. Meant for small outputs - a sheet holds at most `EXCEL_MAX_ROWS` rows, larger tables belong in .parquet,
+    .arrow or .csv files.
+
+    :param path: the .xlsx file written
+    """
+
+    def __init__(self, path: str) -> None:
+        try:
+            import xlsxwriter
+        except ImportError:
+            logging.error("Exporting to .xlsx needs xlsxwriter (`pip install xlsxwriter`) - or export to .parquet, "
+                          ".arrow or .csv.")
+            exit(1)
+        self.path = path
+        self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+
+    def sheet(self, name: str) -> 'ExcelSheetWriter':
+        """Returns the writer of a new sheet (names are cut to Excel's 31 characters)."""
+        return ExcelSheetWriter(self.path, self._workbook.add_worksheet(name[:31]))
+
+    def close(self) -> None:
+        self._workbook.close()
+
+    def __enter__(self) -> 'ExcelWorkbook':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ExcelSheetWriter(TableWriter):
+    """One sheet of an `ExcelWorkbook` - the header is written with the first chunk, empty cells are left blank."""
+
+    def __init__(self, path: str, worksheet) -> None:
+        super().__init__(path)
+        self._worksheet = worksheet
+
+    def _write(self, frame):
+        if self.rows + len(frame) + 1 > EXCEL_MAX_ROWS:
+            logging.error(f"The '{self._worksheet.get_name()}' table has more rows than an Excel sheet holds "
+                          f"({EXCEL_MAX_ROWS:,}) - export it to .parquet, .arrow or .csv instead.")
+            exit(1)
+        if self.rows == 0:
+            self._worksheet.write_row(0, 0, [str(column) for column in frame.columns])
+
+        # plain Python values (xlsxwriter doesn't take NumPy scalars), and None for NaN / NaT
+        cells = frame.astype(object).where(frame.notna(), None).to_numpy().tolist()
+        for row, values in enumerate(cells, start=self.rows + 1):
+            self._worksheet.write_row(row, 0, values)
+
+
+def export_format(path: str, fmt: str = None) -> str:
+    """Returns the export format of `path` - `fmt` if given, else the one its extension stands for."""
+    if fmt is None:
+        extension = os.path.splitext(path)[1].lower()
+        fmt = {'.feather': 'arrow', **{ext: name for name, ext in EXTENSIONS.items()}}.get(extension)
+    if fmt not in EXTENSIONS:
+        logging.error(f"Unknown export format for {path} - use one of {', '.join(EXTENSIONS)}.")
+        exit(1)
+    return fmt
+
+
+def open_table(path: str, fmt: str = None) -> TableWriter:
+    """
+    Returns the chunked writer of a .csv, .parquet or .arrow table (the format is taken from the extension unless
+    given) - .xlsx tables are sheets of an `ExcelWorkbook`.
+    """
+    fmt = export_format(path, fmt)
+    if fmt == 'xlsx':
+        logging.error("Excel tables are written as the sheets of an `ExcelWorkbook` - use `export_tables`.")
+        exit(1)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return {'csv': CSVWriter, 'parquet': ParquetWriter, 'arrow': ArrowWriter}[fmt](path)
+
+
+def write_chunks(
+        writer: TableWriter,
+        table: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        chunk_rows: int = EXPORT_CHUNK_ROWS
+) -> int:
+    """
+    Writes a DataFrame `chunk_rows` rows at a time, or every chunk of an iterable of DataFrames as it is produced.
+
+    :return: the number of rows written
+    """
+    chunks = table
+    if isinstance(table, pd.DataFrame):
+        # an empty table still gets its header / schema written
+        chunks = (table.iloc[offset:offset + chunk_rows] for offset in range(0, max(len(table), 1), chunk_rows))
+    for chunk in chunks:
+        writer.write(chunk)
+    return writer.rows
+
+
+def export_tables(
+        tables: Dict[str, Union[pd.DataFrame, Iterable[pd.DataFrame]]],
+        output_path: str,
+        fmt: str = None,
+        chunk_rows: int = EXPORT_CHUNK_ROWS
+) -> List[str]:
+    """
+    Exports several tables at once: to one sheet each of an .xlsx workbook when `output_path` is an .xlsx file (or
+    `fmt` is 'xlsx'), else to one file each (<table name>.csv / .parquet / .arrow) in the `output_path` directory.
+
+    :param tables: the tables by name - DataFrames, or iterables of DataFrame chunks (written as they are produced)
+    :param output_path: the .xlsx file, or the directory the table files are written to
+    :param fmt: 'csv', 'parquet', 'arrow' or 'xlsx' - defaults to 'xlsx' for an .xlsx path, else 'csv'
+    :param chunk_rows: the rows converted & written at a time
+    :return: the paths of the files written
+    """
+    if fmt is None:
+        fmt = 'xlsx' if output_path.lower().endswith('.xlsx') else 'csv'
+    fmt = export_format(output_path, fmt)
+
+    if fmt == 'xlsx':
+        with ExcelWorkbook(output_path) as workbook:
+            for name, table in tables.items():
+                write_chunks(workbook.sheet(name), table, chunk_rows)
+        return [output_path]
+
+    os.makedirs(output_path, exist_ok=True)
+    written = []
+    for name, table in tables.items():
+        path = os.path.join(output_path, f'{name}{EXTENSIONS[fmt]}')
+        with open_table(path, fmt) as writer:
+            write_chunks(writer, table, chunk_rows)
+        written.append(path)
+    return written
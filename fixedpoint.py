@@ -0,0 +1,163 @@
+import logging
+from sys import exit
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+# cash (the weekly investment, the portfolio values) is counted in cents
+CASH_DECIMALS = 2
+
+# decimals the prices of an asset missing from config.price_decimals are counted in (2 = cents) - never fewer than
+# CASH_DECIMALS
+DEFAULT_PRICE_DECIMALS = 2
+
+# decimals the units of an asset missing from config.unit_decimals are counted in (8 = satoshis)
+DEFAULT_UNIT_DECIMALS = 8
+
+
+def to_fixed(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Returns the values as int64 multiples of 10^-decimals (rounded half to even) - NaN becomes 0."""
+    return np.round(np.nan_to_num(np.asarray(values, dtype=float)) * 10 ** decimals).astype(np.int64)
+
+
+def value_in_cents(units: np.ndarray, scales: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """
+    Returns units x price in cents, rounded half up - exact, and overflow-safe: the units are split into whole
+    multiples of the scale and their remainder, so no intermediate product exceeds price x scale.
+
+    :param units: int64 units, in multiples of each asset's smallest unit
+    :param scales: int64 scale of each asset - its unit scale (10^unit decimals) x its price scale in cents
+                   (10^(price decimals - CASH_DECIMALS))
+    :param closes: int64 prices, in multiples of each asset's smallest price increment
+    """
+    whole, fraction = np.divmod(units, scales)
+    return whole * closes + (fraction * closes + scales // 2) // scales
+
+
+class FixedPointResult:
+    """
+    Exact counterpart of `SimulationResult`: cash is int64 cents, prices are int64 multiples of each asset's smallest
+    price increment (cents by default - finer for assets priced in fractions of a cent), units are int64 multiples of
+    each asset's smallest unit (10^-decimals - ex: satoshis for 8 decimals). Each week buys the largest whole number of
+    smallest units the investment affords, and every sum is an integer sum - no float drift, no rounding of the weekly
+    purchase to 2 decimals.
+
+    :param asset_names: the simulated assets, in column order
+    :param dates: the week labels
+    :param closes: (n_weeks x n_assets) mean weekly closing prices (NaN for weeks without a price)
+    :param weekly_investment: the static dollar amount invested weekly
+    :param unit_decimals: the decimals each asset's units are counted in (ex: {'btc': 8}) - defaults to
+                          `DEFAULT_UNIT_DECIMALS` for every asset not listed
+    :param price_decimals: the decimals each asset's prices are counted in (ex: {'shib': 8}) - defaults to
+                           `DEFAULT_PRICE_DECIMALS` for every asset not listed
+    """
+
+    __slots__ = ('asset_names', 'dates', 'closes', 'purchases', 'units', 'value', 'weekly_investment', 'unit_scales',
+                 'price_scales', 'investment_cents')
+
+    def __init__(
+            self,
+            asset_names: Sequence[str],
+            dates: np.ndarray,
+            closes: np.ndarray,
+            weekly_investment: float,
+            unit_decimals: Dict[str, int] = None,
+            price_decimals: Dict[str, int] = None
+    ) -> None:
+        unit_decimals = unit_decimals or {}
+        price_decimals = price_decimals or {}
+        unit_scales = 10 ** np.array([unit_decimals.get(asset, DEFAULT_UNIT_DECIMALS) for asset in asset_names],
+                                     dtype=np.int64)
+        price_decimals = np.array([price_decimals.get(asset, DEFAULT_PRICE_DECIMALS) for asset in asset_names])
+        if (price_decimals < CASH_DECIMALS).any():
+            logging.error(f"Prices can't be counted in fewer decimals than cash ({CASH_DECIMALS}) - raise "
+                          f"`price_decimals` in config.py.")
+            exit(1)
+        price_scales = 10 ** price_decimals.astype(np.int64)
+        investment_cents = int(to_fixed(weekly_investment, CASH_DECIMALS))
+        priced = ~np.isnan(closes)
+        closes = to_fixed(closes, price_decimals)
+
+        # a price rounding to 0 would buy infinitely many units
+        too_small = priced & (closes <= 0)
+        if too_small.any():
+            assets = ', '.join(asset for asset, small in zip(asset_names, too_small.any(axis=0)) if small)
+            logging.error(f"Some weekly prices of {assets} round to 0 at their price decimals - raise "
+                          f"`price_decimals` in config.py for these assets.")
+            exit(1)
+
+        # units x price scale in cents: a purchase is investment x scales / price, a value units x price / scales
+        scales = unit_scales * (price_scales // 10 ** CASH_DECIMALS)
+
+        # the largest intermediate products are investment x scale (purchases) and price x scale (value)
+        # (checked on Python ints, which can't overflow)
+        limit = np.iinfo(np.int64).max
+        largest_scale = int(scales.max())
+        if investment_cents * largest_scale > limit or int(closes.max(initial=0)) * largest_scale > limit:
+            logging.error("The weekly investment or the prices are too large for exact accounting at these unit & "
+                          "price decimals - lower `unit_decimals` or `price_decimals` in config.py.")
+            exit(1)
+
+        # whole smallest units the weekly investment buys - weeks without a price buy nothing
+        purchases = np.where(priced, investment_cents * scales // np.where(priced, closes, 1), 0)
+        units = np.cumsum(purchases, axis=0)
+
+        for name, attribute in [
+            ('asset_names', tuple(asset_names)),
+            # a read-only view - the dates passed in are left as they were
+            ('dates', np.asarray(dates).view()),
+            ('closes', closes),
+            ('purchases', purchases),
+            ('units', units),
+            ('value', value_in_cents(units, scales, closes)),
+            ('weekly_investment', weekly_investment),
+            ('unit_scales', unit_scales),
+            ('price_scales', price_scales),
+            ('investment_cents', investment_cents)
+        ]:
+            if isinstance(attribute, np.ndarray):
+                attribute.setflags(write=False)
+            object.__setattr__(self, name, attribute)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FixedPointResult is immutable")
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state: dict) -> None:
+        # unpickled (ex: from the result cache) - the arrays come back writeable, so they are frozen again
+        for name, attribute in state.items():
+            if isinstance(attribute, np.ndarray):
+                attribute.setflags(write=False)
+            object.__setattr__(self, name, attribute)
+
+    def total_asset_purchased(self) -> np.ndarray:
+        """Returns the exact total quantity of each asset purchased over the entire date range."""
+        return self.units[-1] / self.unit_scales
+
+    def total_usd_invested(self) -> float:
+        """Returns the total USD invested over the date range."""
+        return len(self.dates) * self.investment_cents / 10 ** CASH_DECIMALS
+
+    def _usd(self, amounts: np.ndarray, closes: np.ndarray, scale=10 ** CASH_DECIMALS) -> np.ndarray:
+        # weeks without a price are stored as a price of 0 - they are NaN again once converted back to USD
+        return np.where(closes > 0, amounts / scale, np.nan)
+
+    def ending_investment_value(self) -> np.ndarray:
+        """Returns the ending portfolio value in USD of each asset, on the last week of the date range (to the cent)."""
+        return self._usd(self.value[-1], self.closes[-1])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the result as the weekly pivot plus 3 columns per asset, converted back to floats for charting."""
+        frame = pd.DataFrame(self._usd(self.closes, self.closes, self.price_scales),
+                             columns=[f'{asset} Close' for asset in self.asset_names])
+        frame.insert(0, 'Date', self.dates)
+        for i, asset in enumerate(self.asset_names):
+            frame[f'{asset} Weekly Purchase'] = np.where(
+                self.closes[:, i] > 0, self.purchases[:, i] / self.unit_scales[i], np.nan
+            )
+            frame[f'{asset} Rolling Sum'] = self.units[:, i] / self.unit_scales[i]
+            frame[f'{asset} Portfolio Value Rolling Sum'] = self._usd(self.value[:, i], self.closes[:, i])
+        return frame
@@ -1,11 +1,18 @@
 import os
-from math import isnan
-
+import sys
+from contextlib import redirect_stdout
+
+from config import asset1_name, asset2_name, asset_names, chunk_rows, exact_accounting, export_format, \
+    ffill_days, incremental_updates, monte_carlo_paths, monte_carlo_seed, price_decimals, profile_run, report_format, \
+    report_path, result_cache, result_cache_mb, unit_decimals, weekly_investment
+from cache import ResultCache
+from export import export_tables
+from incremental import IncrementalState
+from montecarlo import MonteCarlo
+from profiling import profiler
 from utils import DataImport, RunSimulator
-from config import asset1_name, asset2_name, weekly_investment
 
-DCA_asset1 = None
-DCA_asset2 = None
+DCA = None
 cross_compare = None
 start_date = None
 end_date = None
@@ -23,98 +30,201 @@ correl = None
 slope = None
 
 
-def main():
-    global DCA_asset1, DCA_asset2, cross_compare, start_date, end_date, range_of_report_yrs, correl, slope, \
+def run_report(main_dir: str = None) -> dict:
+    """
+    Runs the report of the asset pair in config.py - prints the text summary, and returns the results.
+
+    :param main_dir: the directory holding the price .csv files (and where the exports & caches go) - defaults to the
+                     project directory
+    """
+    global DCA, cross_compare, start_date, end_date, range_of_report_yrs, correl, slope, \
         total_usd_invested, ending_units_asset1, ending_units_asset2, ending_usd_asset1, ending_usd_asset2, \
         real_roi_asset1, real_roi_asset2, nom_roi_asset1, nom_roi_asset2
 
-    main_dir = os.path.dirname(__file__)
-    output_path = os.path.join(main_dir, "Raw Data.xlsx")
-
-    # instantiate data import
-    run = DataImport(main_directory=main_dir)
-
-    # determine date range
-    start_date, end_date, range_of_report_yrs = run.determine_date_range()
-    print(f"Running report for date range: {start_date} through {end_date}, spanning {range_of_report_yrs} years...")
-
-    # determine CPI for time period (in order to determine inflation rate)
-    RunSimulator.cpi_scrape(start_date, end_date)
-    # print(f"The CPI for this date range is {RunSimulator.cpi_scrape(start_date, end_date)}")
-
-    # pivot the data by year/week and obtain average weekly closing price
-    cross_compare = run.join_dfs_and_pivot_weekly(join_method='inner')
-
-    # quick EDA (optional)
-    # print(cross_compare.head())
-    # print(cross_compare.info())
-
-    # export data to excel file (optional)
-    # run.export_df(output_path)
-
-    # unpack DCA investment simulation for asset 1
-    DCA_asset1 = RunSimulator(cross_compare, asset1_name, weekly_investment)
-    DCA_asset1.rolling_totals()
-    ending_usd_asset1 = DCA_asset1.ending_investment_value()
-    ending_units_asset1 = DCA_asset1.total_asset_purchased()
-    nom_roi_asset1 = DCA_asset1.nominal_roi()
-    real_roi_asset1 = DCA_asset1.real_roi()
-    usd_return_inflation_adj_1 = DCA_asset1.usd_return_inflation_adjusted()
-
-    # unpack DCA investment simulation for asset 2
-    DCA_asset2 = RunSimulator(cross_compare, asset2_name, weekly_investment)
-    DCA_asset2.rolling_totals()
-    ending_usd_asset2 = DCA_asset2.ending_investment_value()
-    ending_units_asset2 = DCA_asset2.total_asset_purchased()
-    nom_roi_asset2 = DCA_asset2.nominal_roi()
-    real_roi_asset2 = DCA_asset2.real_roi()
-    usd_return_inflation_adj_2 = DCA_asset2.usd_return_inflation_adjusted()
+    if main_dir is None:
+        main_dir = os.path.dirname(__file__)
+    # an .xlsx workbook, or a directory holding one file per table
+    output_path = os.path.join(main_dir, "Raw Data.xlsx" if export_format == 'xlsx' else "Raw Data")
+    cache = cache_key = cached = None
+
+    if incremental_updates:
+        # only read the rows appended since the last run - the weekly pivot & running totals carry over from its state
+        state = IncrementalState.from_directory(main_dir, asset_names, weekly_investment, join_method='inner',
+                                                ffill_days=ffill_days)
+        state.update()
+        state.save()
+        if exact_accounting:
+            # the state keeps float running totals - the exact ones are recomputed from its (unrounded) weekly prices
+            DCA = RunSimulator(state.to_pivot(round_to=None), asset_names, weekly_investment,
+                               unit_decimals=unit_decimals, price_decimals=price_decimals)
+            cross_compare = DCA.rolling_totals().to_frame()
+        else:
+            result = state.to_result()
+            cross_compare = result.to_frame()
+            DCA = RunSimulator(cross_compare, asset_names, weekly_investment, result=result)
+
+        start_date, end_date, range_of_report_yrs = state.date_range()
+
+        # export the simulation results (optional) - the raw prices aren't kept in the incremental state
+        if export_format is not None:
+            export_tables({'simulation': cross_compare}, output_path, export_format)
+    else:
+        # instantiate data import (lazy - nothing is read until a stage needs it)
+        run = DataImport(main_directory=main_dir, chunk_rows=chunk_rows, ffill_days=ffill_days)
+
+        # a repeated report on unchanged .csv files & parameters is read back from the result cache
+        if result_cache:
+            cache = ResultCache(os.path.join(main_dir, '.result_cache'), max_disk_bytes=result_cache_mb * 2 ** 20)
+            cache_key = cache.key('report', run.price_hash(), asset_names, weekly_investment, 'inner', 'W-MON',
+                                  ffill_days, 'dca', (unit_decimals, price_decimals) if exact_accounting else None)
+            cached = cache.get(cache_key)
+
+        if cached is not None:
+            start_date, end_date, range_of_report_yrs = cached['date_range']
+            # handed to the import as its simulation, so an export holds the same tables as on a cache miss
+            DCA = run.simulate(weekly_investment, join_method='inner',
+                               unit_decimals=unit_decimals if exact_accounting else None, price_decimals=price_decimals,
+                               result=cached['result'])
+            cross_compare = DCA.result.to_frame()
+        else:
+            # determine date range
+            start_date, end_date, range_of_report_yrs = run.determine_date_range()
+
+            # pivot the data by year/week and obtain average weekly closing price, then run the DCA investment
+            # simulation for every asset in one pass - the pivot is built once, and reused by any later stage (ex:
+            # export_df)
+            DCA = run.simulate(weekly_investment, join_method='inner',
+                               unit_decimals=unit_decimals if exact_accounting else None, price_decimals=price_decimals)
+            cross_compare = DCA.result.to_frame()
+
+        # quick EDA (optional)
+        # print(cross_compare.head())
+        # print(cross_compare.info())
+
+        # export data to excel / columnar files (optional)
+        if export_format is not None:
+            run.export_df(output_path, export_format)
+
+    if report_format != 'json':
+        print(f"Running report for date range: {start_date} through {end_date}, "
+              f"spanning {range_of_report_yrs} years...")
+
+    # determine CPI for time period (in order to determine inflation rate), from the local CPI store
+    RunSimulator.cpi_lookup(start_date, end_date)
+    # print(f"The CPI for this date range is {RunSimulator.cpi_lookup(start_date, end_date)}")
+
+    # unpack the results of the DCA investment simulation for both assets
+    ending_usd = DCA.ending_investment_value()
+    ending_units = DCA.total_asset_purchased()
+    nom_roi = DCA.nominal_roi()
+    real_roi = DCA.real_roi()
+    usd_return_inflation_adj = DCA.usd_return_inflation_adjusted()
+
+    ending_usd_asset1, ending_usd_asset2 = ending_usd[asset1_name], ending_usd[asset2_name]
+    ending_units_asset1, ending_units_asset2 = ending_units[asset1_name], ending_units[asset2_name]
+    nom_roi_asset1, nom_roi_asset2 = nom_roi[asset1_name], nom_roi[asset2_name]
+    real_roi_asset1, real_roi_asset2 = real_roi[asset1_name], real_roi[asset2_name]
+    usd_return_inflation_adj_1 = usd_return_inflation_adj[asset1_name]
+    usd_return_inflation_adj_2 = usd_return_inflation_adj[asset2_name]
 
     # static analytical variables
-    total_usd_invested = DCA_asset1.total_usd_invested()
-    inflation_rate = DCA_asset1.inflation_rate()
-    correl = RunSimulator.correlation(cross_compare)[0]
-    slope = RunSimulator.correlation(cross_compare)[1]
-
-    # summary statements:
-    # if CPI of 0 is detected, omit inflation stats
-    if DCA_asset1.cpi_starting == 0 or DCA_asset2.cpi_ending == 0 \
-            or isnan(DCA_asset1.cpi_starting) or isnan(DCA_asset2.cpi_ending):
-        print(f"Weekly DCA of ${weekly_investment} for {range_of_report_yrs} years (assuming you market sell everything"
-              f" on the week of {end_date}):\n"
-              f"Total invested: ${total_usd_invested:,.0f}\n\n"
-              f"RESULTS ${asset1_name.upper()}:\n"
-              f"Ending Value: ${ending_usd_asset1:,.0f}\n"
-              f"Ending Quantity: {ending_units_asset1} units of {asset1_name}\n"
-              f"Nominal ROI: {nom_roi_asset1}%.\n\n"
-              f"RESULTS ${asset2_name.upper()}:\n"
-              f"Ending Value: ${ending_usd_asset2:,.0f}\n"
-              f"Ending Quantity: {ending_units_asset2} units of {asset2_name}\n"
-              f"Nominal ROI: {nom_roi_asset2}%\n\n"
-              f"These two assets have a correlation of {correl}. "
-              f"For every $1 increase in the weaker asset, the other increased by ~{slope}x.\n"
-              )
-
-    # otherwise, return the print statement with inflation stats
+    total_usd_invested = DCA.total_usd_invested()
+    inflation_rate = DCA.inflation_rate()
+    # if a CPI of 0 (or none) is found, the inflation stats are omitted
+    inflation_known = DCA.cpi_starting > 0 and DCA.cpi_ending > 0
+    if cached is not None:
+        correl, slope = cached['correlation']
     else:
-        print(f"\nWeekly DCA of ${weekly_investment} for {range_of_report_yrs} years (market sell on {end_date}):\n"
-              f"Total invested: ${total_usd_invested:,.0f}\n"
-              f"USD has lost {inflation_rate}% of its value over this period.\n\n"
-              f"RESULTS ${asset1_name.upper()}:\n"
-              f"Ending Value: ${ending_usd_asset1:,.0f}\n"
-              f"Ending Quantity: {ending_units_asset1} units of {asset1_name}\n"
-              f"Nominal ROI: {nom_roi_asset1}%\n"
-              f"Real ROI: {real_roi_asset1}% - "
-              f"That's ${usd_return_inflation_adj_1:,.0f} in {start_date.year} dollars.\n\n"
-              f"RESULTS ${asset2_name.upper()}:\n"
-              f"Ending Value: ${ending_usd_asset2:,.0f}\n"
-              f"Ending Quantity: {ending_units_asset2} units of {asset2_name}\n"
-              f"Nominal ROI: {nom_roi_asset2}%\n"
-              f"Real ROI: {real_roi_asset2}% - "
-              f"That's ${usd_return_inflation_adj_2:,.0f} in {start_date.year} dollars.\n\n"
-              f"These two assets have a correlation of {correl}. "
-              f"For every $1 increase in the weaker asset, the other increased by ~{slope}x.\n"
-              )
+        correl, slope = RunSimulator.correlation(cross_compare)
+        if cache is not None:
+            cache.put(cache_key, {'date_range': (start_date, end_date, range_of_report_yrs), 'result': DCA.result,
+                                  'correlation': (correl, slope)})
+
+    results = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'range_of_report_yrs': range_of_report_yrs,
+        'weekly_investment': weekly_investment,
+        'total_usd_invested': total_usd_invested,
+        'inflation_rate': inflation_rate if inflation_known else None,
+        'ending_usd': ending_usd,
+        'ending_units': ending_units,
+        'nominal_roi': nom_roi,
+        'real_roi': real_roi if inflation_known else dict.fromkeys(asset_names),
+        'usd_return_inflation_adjusted': usd_return_inflation_adj if inflation_known else dict.fromkeys(asset_names),
+        'correlation': correl,
+        'slope': slope
+    }
+
+    # spread of the outcomes: percentile bands of the ending value & ROI over block-bootstrapped price paths
+    if monte_carlo_paths:
+        bands = MonteCarlo(cross_compare, asset_names, weekly_investment).run(monte_carlo_paths, seed=monte_carlo_seed)
+        results['monte_carlo'] = bands.to_dict(orient='records')
+
+    if report_format in ('text', 'both'):
+        # summary statements:
+        # if CPI of 0 is detected, omit inflation stats
+        if not inflation_known:
+            print(f"Weekly DCA of ${weekly_investment} for {range_of_report_yrs} years (assuming you market sell "
+                  f"everything on the week of {end_date}):\n"
+                  f"Total invested: ${total_usd_invested:,.0f}\n\n"
+                  f"RESULTS ${asset1_name.upper()}:\n"
+                  f"Ending Value: ${ending_usd_asset1:,.0f}\n"
+                  f"Ending Quantity: {ending_units_asset1} units of {asset1_name}\n"
+                  f"Nominal ROI: {nom_roi_asset1}%.\n\n"
+                  f"RESULTS ${asset2_name.upper()}:\n"
+                  f"Ending Value: ${ending_usd_asset2:,.0f}\n"
+                  f"Ending Quantity: {ending_units_asset2} units of {asset2_name}\n"
+                  f"Nominal ROI: {nom_roi_asset2}%\n\n"
+                  f"These two assets have a correlation of {correl}. "
+                  f"For every $1 increase in the weaker asset, the other increased by ~{slope}x.\n"
+                  )
+
+        # otherwise, return the print statement with inflation stats
+        else:
+            print(f"\nWeekly DCA of ${weekly_investment} for {range_of_report_yrs} years (market sell on {end_date}):\n"
+                  f"Total invested: ${total_usd_invested:,.0f}\n"
+                  f"USD has lost {inflation_rate}% of its value over this period.\n\n"
+                  f"RESULTS ${asset1_name.upper()}:\n"
+                  f"Ending Value: ${ending_usd_asset1:,.0f}\n"
+                  f"Ending Quantity: {ending_units_asset1} units of {asset1_name}\n"
+                  f"Nominal ROI: {nom_roi_asset1}%\n"
+                  f"Real ROI: {real_roi_asset1}% - "
+                  f"That's ${usd_return_inflation_adj_1:,.0f} in {start_date.year} dollars.\n\n"
+                  f"RESULTS ${asset2_name.upper()}:\n"
+                  f"Ending Value: ${ending_usd_asset2:,.0f}\n"
+                  f"Ending Quantity: {ending_units_asset2} units of {asset2_name}\n"
+                  f"Nominal ROI: {nom_roi_asset2}%\n"
+                  f"Real ROI: {real_roi_asset2}% - "
+                  f"That's ${usd_return_inflation_adj_2:,.0f} in {start_date.year} dollars.\n\n"
+                  f"These two assets have a correlation of {correl}. "
+                  f"For every $1 increase in the weaker asset, the other increased by ~{slope}x.\n"
+                  )
+
+        if monte_carlo_paths:
+            print(f"Ending value & ROI percentiles over {monte_carlo_paths:,} bootstrapped price paths:\n"
+                  f"{bands.to_string(index=False)}\n")
+
+    return results
+
+
+def main():
+    if profile_run:
+        profiler.enable()
+    # in JSON mode stdout carries the report only - the warnings printed along the way go to stderr
+    with redirect_stdout(sys.stderr if report_format == 'json' else sys.stdout):
+        results = run_report()
+
+    # machine-readable report: the results, plus the per-stage profile when profile_run is on
+    if report_format in ('json', 'both'):
+        report = profiler.to_json(results)
+        if report_path:
+            with open(report_path, 'w') as f:
+                f.write(report)
+        else:
+            print(report)
+
+    profiler.disable()
 
 
 if __name__ == '__main__':
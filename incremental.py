@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+from io import StringIO
+from sys import exit
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from align import last_rows
+from profiling import profiled
+from utils import DataImport, SimulationResult, find_price_csvs
+
+# number of consumed bytes remembered per file, to detect files that were rewritten rather than appended to
+TAIL_BYTES = 64
+
+# layout of weekly_state.json - states saved in another layout are rebuilt
+STATE_VERSION = 2
+
+
+class IncrementalState:
+    """
+    Keeps the weekly pivot and the DCA running totals between runs, so that appending new bars to the price .csv files
+    only costs O(new rows): the new rows are read from where the last run stopped, only the current (partial) week is
+    re-averaged, and the running totals carry on from the last completed week.
+
+    The results are identical to a full rebuild with `DataImport.join_dfs_and_pivot_weekly` + `RunSimulator`:
+    a full rebuild is simply an update starting from an empty state. Files that were rewritten (not appended to), or a
+    change of weekly_investment/join method/ffill_days/assets, reset the state.
+
+    Rows are only consumed up to the latest date every file has reached, so a file updated ahead of the others doesn't
+    lose rows to the join. A trailing line is only read once it ends with a newline.
+
+    :param csv_paths: the price-history .csv of every asset, keyed by asset name
+    :param weekly_investment: the static dollar amount to invest weekly
+    :param join_method: the join method (left, right, inner, outer)
+    :param state_path: the .json file the state is kept in between runs
+    :param ffill_days: how many days a price is carried forward when aligning the assets (see `DataImport`) - every
+                       asset's last consumed row is kept, to forward-fill from across updates
+    """
+
+    def __init__(
+            self,
+            csv_paths: Dict[str, str],
+            weekly_investment: float,
+            join_method: str = 'inner',
+            state_path: str = None,
+            ffill_days: int = 0
+    ) -> None:
+        self.asset_names = list(csv_paths)
+        self.csv_paths = [csv_paths[asset] for asset in self.asset_names]
+        self.weekly_investment = weekly_investment
+        self.join_method = join_method
+        self.ffill_days = ffill_days
+        self.state_path = state_path if state_path is not None else \
+            os.path.join(os.path.dirname(self.csv_paths[0]), 'weekly_state.json')
+
+        self._reset()
+        self._load()
+
+    @classmethod
+    def from_directory(
+            cls,
+            main_directory: str,
+            asset_names: Sequence[str],
+            weekly_investment: float,
+            join_method: str = 'inner',
+            ffill_days: int = 0
+    ) -> 'IncrementalState':
+        """Matches each asset with its .csv in the directory (see `utils.find_price_csvs`), then loads its state."""
+        csv_paths = dict(zip(asset_names, find_price_csvs(main_directory, asset_names)))
+        return cls(csv_paths, weekly_investment, join_method, os.path.join(main_directory, 'weekly_state.json'),
+                   ffill_days)
+
+    def _reset(self) -> None:
+        """Empties the state - the next update then rebuilds everything from the start of each file."""
+        n_assets = len(self.asset_names)
+        self.offsets = [0] * n_assets
+        self.headers = [None] * n_assets
+        self.tails = [''] * n_assets
+        # first & last date read from every file - the report covers the range they all share
+        self.first_dates = [None] * n_assets
+        self.last_dates = [None] * n_assets
+        self.watermark = None
+        # (date, price) of every asset's last consumed row - forward-filled onto the next update's dates
+        self.last_seen = [None] * n_assets
+        # aligned rows of the current, still open week
+        self.open_rows = pd.DataFrame(columns=self.asset_names, dtype=float, index=pd.DatetimeIndex([], name='Date'))
+        # completed weeks: week labels, (unrounded) mean weekly closes, and the running units held at the end of each
+        # week
+        self.week_dates = np.array([], dtype='datetime64[ns]')
+        self.week_closes = np.empty((0, n_assets))
+        self.week_units = np.empty((0, n_assets))
+
+    def _params(self) -> dict:
+        return {
+            'version': STATE_VERSION,
+            'assets': self.asset_names,
+            'files': [os.path.abspath(path) for path in self.csv_paths],
+            'weekly_investment': self.weekly_investment,
+            'join_method': self.join_method,
+            'ffill_days': self.ffill_days
+        }
+
+    def _load(self) -> None:
+        """Loads the saved state, unless it is missing or was built with other parameters."""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('params') != self._params():
+            return
+
+        self.offsets = state['offsets']
+        self.headers = state['headers']
+        self.tails = state['tails']
+        self.first_dates = [pd.Timestamp(date) if date else None for date in state['first_dates']]
+        self.last_dates = [pd.Timestamp(date) if date else None for date in state['last_dates']]
+        self.watermark = pd.Timestamp(state['watermark']) if state['watermark'] else None
+        self.last_seen = [(np.datetime64(row[0], 'ns'), row[1]) if row else None for row in state['last_seen']]
+        self.open_rows = pd.DataFrame(
+            np.array(state['open_closes'], dtype=float).reshape(-1, len(self.asset_names)),
+            columns=self.asset_names,
+            index=pd.DatetimeIndex(pd.to_datetime(state['open_dates']), name='Date')
+        )
+        self.week_dates = np.array(state['week_dates'], dtype='datetime64[ns]')
+        self.week_closes = np.array(state['week_closes'], dtype=float).reshape(-1, len(self.asset_names))
+        self.week_units = np.array(state['week_units'], dtype=float).reshape(-1, len(self.asset_names))
+
+    def save(self) -> None:
+        """Writes the state to disk (atomically), for the next run to pick up from."""
+        state = {
+            'params': self._params(),
+            'offsets': self.offsets,
+            'headers': self.headers,
+            'tails': self.tails,
+            'first_dates': [date.isoformat() if date is not None else None for date in self.first_dates],
+            'last_dates': [date.isoformat() if date is not None else None for date in self.last_dates],
+            'watermark': self.watermark.isoformat() if self.watermark is not None else None,
+            'last_seen': [[str(row[0]), float(row[1])] if row is not None else None for row in self.last_seen],
+            'open_dates': [date.isoformat() for date in self.open_rows.index],
+            'open_closes': self.open_rows.to_numpy(dtype=float).tolist(),
+            'week_dates': [str(date) for date in self.week_dates],
+            'week_closes': self.week_closes.tolist(),
+            'week_units': self.week_units.tolist()
+        }
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _was_rewritten(self, i: int) -> bool:
+        """Returns True if the part of file i consumed so far has changed since the last run."""
+        if self.offsets[i] == 0:
+            return False
+        tail = self.tails[i].encode('latin1')
+        with open(self.csv_paths[i], 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.offsets[i]:
+                return True
+            f.seek(self.offsets[i] - len(tail))
+            return f.read(len(tail)) != tail
+
+    def _read_new_rows(self, i: int) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Returns the (Date, Close) rows appended to file i since the last consumed byte, along with the file offset at
+        the end of each of those rows.
+        """
+        with open(self.csv_paths[i], 'rb') as f:
+            f.seek(self.offsets[i])
+            data = f.read()
+
+        base = self.offsets[i]
+        if self.headers[i] is None:
+            header, _, data = data.partition(b'\n')
+            self.headers[i] = header.decode('latin1').rstrip('\r')
+            base += len(header) + 1
+            self.offsets[i] = base
+            self.tails[i] = (header + b'\n')[-TAIL_BYTES:].decode('latin1')
+
+        # only complete lines are read, blank lines are skipped
+        lines = data[:data.rfind(b'\n') + 1].split(b'\n')[:-1]
+        line_ends = base + np.cumsum([len(line) + 1 for line in lines], dtype=np.int64)
+        rows = [k for k, line in enumerate(lines) if line.strip()]
+        if not rows:
+            return pd.DataFrame({'Date': pd.DatetimeIndex([]), 'Close': np.array([], dtype=float)}), np.array([])
+
+        new_rows = pd.read_csv(
+            StringIO('\n'.join([self.headers[i], *(lines[k].decode('latin1') for k in rows)])),
+            usecols=lambda col: col in ('Date', 'Close')
+        )
+        try:
+            new_rows['Date'] = pd.to_datetime(new_rows['Date'])
+        except (KeyError, ValueError):
+            logging.exception(f"Couldn't read the new rows of {self.csv_paths[i]} - check that it has a 'Date' and "
+                              f"'Close' column, and that the appended dates are formatted like the rest of the file.")
+            exit(1)
+        return new_rows[['Date', 'Close']], line_ends[rows]
+
+    def _close_weeks(self, weekly: pd.DataFrame) -> None:
+        """Appends completed weeks, carrying the running units on from the last completed week."""
+        closes = weekly.to_numpy(dtype=float)
+        purchases = np.nan_to_num(np.round(self.weekly_investment / np.round(closes, 2), 2))
+        units_before = self.week_units[-1:] if len(self.week_units) else np.zeros((1, closes.shape[1]))
+
+        self.week_dates = np.concatenate([self.week_dates, weekly.index.to_numpy(dtype='datetime64[ns]')])
+        self.week_closes = np.vstack([self.week_closes, closes])
+        self.week_units = np.vstack([self.week_units, np.cumsum(np.vstack([units_before, purchases]), axis=0)[1:]])
+
+    @profiled('incremental update', rows=lambda result, *_: result)
+    def update(self) -> int:
+        """
+        Consumes the rows appended to the price files since the last update.
+        :return: the number of new (aligned) rows taken into the weekly pivot
+        """
+        if any(self._was_rewritten(i) for i in range(len(self.csv_paths))):
+            print("\nA price file was rewritten since the last run - rebuilding the weekly state from scratch.\n")
+            self._reset()
+
+        new_rows = [self._read_new_rows(i) for i in range(len(self.csv_paths))]
+        for i, (rows, _) in enumerate(new_rows):
+            if len(rows):
+                first_date, last_date = rows['Date'].min(), rows['Date'].max()
+                if self.first_dates[i] is None or first_date < self.first_dates[i]:
+                    self.first_dates[i] = first_date
+                if self.last_dates[i] is None or last_date > self.last_dates[i]:
+                    self.last_dates[i] = last_date
+
+        # rows are consumed up to the latest date that every file has reached
+        last_dates = [rows['Date'].iloc[-1] if len(rows) else self.watermark for rows, _ in new_rows]
+        if any(date is None for date in last_dates):
+            return 0
+        watermark = min(last_dates)
+
+        closes: List[pd.Series] = []
+        for i, (rows, line_ends) in enumerate(new_rows):
+            n_rows = int(np.searchsorted(rows['Date'].to_numpy(), np.datetime64(watermark), side='right'))
+            closes.append(rows.iloc[:n_rows].set_index('Date')['Close'].rename(self.asset_names[i]))
+            if n_rows:
+                self.offsets[i] = int(line_ends[n_rows - 1])
+                with open(self.csv_paths[i], 'rb') as f:
+                    f.seek(max(self.offsets[i] - TAIL_BYTES, 0))
+                    self.tails[i] = f.read(min(TAIL_BYTES, self.offsets[i])).decode('latin1')
+        self.watermark = watermark
+
+        aligned = DataImport.align_closes(closes, self.join_method, self.ffill_days, self.last_seen)
+        closes = [series.sort_index(kind='stable') for series in closes]
+        self.last_seen = last_rows([series.index.to_numpy() for series in closes],
+                                   [series.to_numpy(dtype=float) for series in closes], self.last_seen)
+        if aligned.empty:
+            return 0
+
+        # only the open week, and the weeks added since, are averaged - every week before them is already final
+        rows = pd.concat([self.open_rows, aligned]) if len(self.open_rows) else aligned
+        weekly = DataImport.resample_weekly(rows, round_to=None)
+        self._close_weeks(weekly.iloc[:-1])
+        self.open_rows = rows[rows.index > weekly.index[-1] - pd.Timedelta(weeks=1)]
+
+        return len(aligned)
+
+    def date_range(self) -> List:
+        """
+        Returns the [start date, end date, years] of the report - the range every file covers, validated like
+        `DataImport.determine_date_range` (>=1Y of overlap, with a warning when the files' ranges differ).
+        """
+        if any(date is None for date in self.first_dates):
+            logging.error("Check to make sure every price .csv file holds at least one row of price data.\n\n")
+            exit(1)
+        return DataImport.shared_date_range(list(zip(self.first_dates, self.last_dates)))
+
+    def _weekly_closes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the week labels and the unrounded mean weekly closes of the stored weeks plus the open week."""
+        if not len(self.open_rows):
+            return self.week_dates, self.week_closes
+        open_week = DataImport.resample_weekly(self.open_rows, round_to=None)
+        return (np.concatenate([self.week_dates, open_week.index.to_numpy(dtype='datetime64[ns]')]),
+                np.vstack([self.week_closes, open_week.to_numpy(dtype=float)]))
+
+    def to_pivot(self, round_to: Optional[int] = 2) -> pd.DataFrame:
+        """
+        Returns the weekly pivot the state was built from - the DataFrame `DataImport.join_dfs_and_pivot_weekly` would
+        return, rounded to `round_to` decimals (None leaves the means unrounded, for exact accounting).
+        """
+        dates, closes = self._weekly_closes()
+        piv = pd.DataFrame(closes if round_to is None else np.round(closes, round_to),
+                           columns=[f'{asset} Close' for asset in self.asset_names])
+        piv.insert(0, 'Date', dates)
+        return piv
+
+    def to_result(self) -> SimulationResult:
+        """
+        Returns the simulation of the stored weeks plus the open week, as the `SimulationResult` a full rebuild with
+        `RunSimulator.rolling_totals` would produce.
+        """
+        dates, closes = self._weekly_closes()
+        closes = np.round(closes, 2)
+        units = self.week_units
+        if len(closes) > len(units):
+            # the open week
+            units_before = units[-1:] if len(units) else np.zeros_like(closes[-1:])
+            units = np.vstack([units, units_before + np.nan_to_num(np.round(self.weekly_investment / closes[-1:], 2))])
+
+        purchases = np.round(self.weekly_investment / closes, 2)
+        return SimulationResult(
+            self.asset_names, dates, closes, purchases, units, np.round(units * closes, 2), self.weekly_investment
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the weekly pivot with the simulation columns - the same DataFrame a full rebuild would produce."""
+        return self.to_result().to_frame()
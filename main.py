@@ -1,92 +1,278 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-import importer as i
-from config import moving_average_weeks
-
-# load in data to graph
-i.main()
-
-# add black background
-plt.rcParams['axes.facecolor'] = 'black'
-
-# assign axis and chart-size
-fig, ax = plt.subplots(figsize=[12, 5])
-
-# create line chart for the two assets, on one axis
-for asset, color in {f'{i.asset1_name}': '#F7931A', f'{i.asset2_name}': '#FFD700'}.items():
-    sns.lineplot(
-        data=i.cross_compare,
-        x='Date',
-        y=i.cross_compare[f'{asset} Portfolio Value Rolling Sum'].rolling(
-                moving_average_weeks if moving_average_weeks > 0 else 1,
-                min_periods=0
-            ).mean(),
-        linewidth=4,
-        color=color,
-        label=asset.upper()
+import argparse
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from config import chunk_rows, ffill_days, moving_average_weeks, rolling_entry_heatmap, weekly_investment
+
+# series longer than this are down-sampled before they are drawn - a chart is ~1,000 pixels wide anyway
+MAX_POINTS = 2_000
+
+# line colors of the first & second asset of a pair
+COLORS = ['#F7931A', '#FFD700']
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing moving average over `window` weeks, from a single cumulative sum - same values as
+    `pd.Series.rolling(window, min_periods=0).mean()`: the first weeks average what's available, missing weeks are
+    skipped, and weeks with nothing to average are NaN.
+    """
+    window = max(window, 1)
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+
+    sums = np.concatenate([[0], np.cumsum(np.where(present, values, 0))])
+    counts = np.concatenate([[0], np.cumsum(present)])
+    starts = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+
+    window_counts = counts[1:] - counts[starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, (sums[1:] - sums[starts]) / window_counts, np.nan)
+
+
+def downsample(n_points: int, max_points: int = MAX_POINTS) -> np.ndarray:
+    """Returns the indices of at most `max_points` evenly spaced points (always keeping the first and last one)."""
+    if n_points <= max_points:
+        return np.arange(n_points)
+    return np.unique(np.linspace(0, n_points - 1, max_points).round().astype(int))
+
+
+def _pyplot(headless: bool):
+    """Imports pyplot on first use - with the non-interactive Agg backend for headless rendering."""
+    import matplotlib
+
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def importer_stats() -> dict:
+    """Runs importer.py (printing its report), and returns the stats of the asset pair in config.py for charting."""
+    import importer as i
+
+    i.main()
+    return {
+        'pair': [i.asset1_name, i.asset2_name],
+        'frame': i.cross_compare,
+        'range_of_report_yrs': i.range_of_report_yrs,
+        'total_usd_invested': i.DCA.total_usd_invested(),
+        'ending_units': i.DCA.total_asset_purchased(),
+        'ending_usd': i.DCA.ending_investment_value(),
+        'nominal_roi': i.DCA.nominal_roi(),
+        'real_roi': i.DCA.real_roi(),
+        'inflation_known': i.DCA.cpi_starting > 0 and i.DCA.cpi_ending > 0,
+        'correl': i.correl,
+        'slope': i.slope
+    }
+
+
+def pair_stats(run, pair: Sequence[str]) -> dict:
+    """Returns the stats of one asset pair for charting, simulated from `run` (a `DataImport` holding both assets)."""
+    from utils import RunSimulator
+
+    pair = list(pair)
+    start_date, end_date, range_of_report_yrs = run.determine_date_range(pair)
+    RunSimulator.cpi_lookup(start_date, end_date)
+
+    simulator = run.simulate(weekly_investment, join_method='inner', asset_names=pair)
+    summary = run.summarize(weekly_investment, join_method='inner', asset_names=pair)
+    frame = simulator.result.to_frame()
+    correl, slope = RunSimulator.correlation(frame, pair)
+
+    return {
+        'pair': pair,
+        'frame': frame,
+        'range_of_report_yrs': range_of_report_yrs,
+        'total_usd_invested': summary['total_usd_invested'],
+        'ending_units': summary['ending_units'],
+        'ending_usd': summary['ending_usd'],
+        'nominal_roi': summary['nominal_roi'],
+        'real_roi': summary['real_roi'],
+        'inflation_known': simulator.cpi_starting > 0 and simulator.cpi_ending > 0,
+        'correl': correl,
+        'slope': slope
+    }
+
+
+def summary_text(stats: dict) -> str:
+    """Returns the results summary shown in the chart's text box (real ROI when the CPI is known, else nominal)."""
+    text = f"Total initial investment: ${stats['total_usd_invested']:,.0f}\n\n"
+    for asset in stats['pair']:
+        text += f"Ending {asset.upper()}: {stats['ending_units'][asset].round(1)} {asset.upper()} " \
+                f"(${stats['ending_usd'][asset]:,.0f})\n"
+        if stats['inflation_known']:
+            text += f"Real RoI: {int(stats['real_roi'][asset])}%\n\n"
+        else:
+            text += f"Nominal RoI {asset.upper()}: {int(stats['nominal_roi'][asset])}%\n\n"
+    return text + f"Correlation; {stats['correl']}\nMagnitude: 1:{stats['slope']}"
+
+
+def plot_pair(plt, stats: dict, max_points: int = MAX_POINTS):
+    """Draws the portfolio value (moving average) of both assets of a pair, with the results summary."""
+    # add black background
+    plt.rcParams['axes.facecolor'] = 'black'
+
+    # assign axis and chart-size
+    fig, ax = plt.subplots(figsize=[12, 5])
+
+    # create line chart for the two assets, on one axis - smoothed over every week, then down-sampled for drawing
+    frame = stats['frame']
+    points = downsample(len(frame), max_points)
+    dates = frame['Date'].to_numpy()[points]
+    for asset, color in zip(stats['pair'], COLORS):
+        smoothed = moving_average(frame[f'{asset} Portfolio Value Rolling Sum'].to_numpy(), moving_average_weeks)
+        ax.plot(dates, smoothed[points], linewidth=4, color=color, label=asset.upper())
+
+    # add title
+    ax.set_title(
+        f'{stats["pair"][0].upper()} vs {stats["pair"][1].upper()}: '
+        f'{stats["range_of_report_yrs"]} years DCA ({moving_average_weeks}-wk MA)',
+        fontsize=12
     )
 
-# add title
-plt.title(
-    f'{i.asset1_name.upper()} vs {i.asset2_name.upper()}: '
-    f'{i.range_of_report_yrs} years DCA ({moving_average_weeks}-wk MA)',
-    fontsize=12
-)
-
-# format x labels
-plt.xlabel('')
-
-# format y labels
-plt.ylabel('Portfolio Value')
-ax.grid(axis='y', color='darkgray', linestyle='dotted')
-ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f"${x:,.0f}"))
-
-# apply legend
-ax.legend(labelcolor='white', loc='upper left')
-
-# add creator signature
-ax.text(.01, .01, 'D. Taygunov', color='white', fontsize=8, style='italic', transform=ax.transAxes)
-
-# create text box with results summary from simulation
-results = f"Total initial investment: ${i.total_usd_invested:,.0f}\n\n" \
-       f"Ending {i.asset1_name.upper()}:" \
-       f" {i.ending_units_asset1.round(1)} {i.asset1_name.upper()} " \
-       f"(${i.ending_usd_asset1:,.0f})\n" \
-       f"Real RoI: {int(i.real_roi_asset1)}%\n\n" \
-       f"Ending {i.asset2_name.upper()}: {i.ending_units_asset2.round(1)} " \
-       f"(${i.ending_usd_asset2:,.0f})\n" \
-       f"Real RoI: {int(i.real_roi_asset2)}%\n\n" \
-       f"Correlation; {i.correl}\n" \
-       f"Magnitude: 1:{i.slope}"
-
-results_no_inflation = f"Total initial investment: ${i.total_usd_invested:,.0f}\n\n" \
-          f"Ending {i.asset1_name.upper()}:" \
-          f" {i.ending_units_asset1.round(1)} {i.asset1_name.upper()} " \
-          f"(${i.ending_usd_asset1:,.0f})\n" \
-          f"Nominal RoI {i.asset1_name.upper()}: {int(i.nom_roi_asset1)}%\n\n" \
-          f"Ending {i.asset2_name.upper()}: {i.ending_units_asset2.round(1)} " \
-          f"(${i.ending_usd_asset2:,.0f})\n" \
-          f"Nominal RoI {i.asset2_name.upper()}: {int(i.nom_roi_asset2)}%\n\n" \
-          f"Correlation; {i.correl}\n" \
-          f"Magnitude: 1:{i.slope}"
-
-# apply summary to text box
-ax.text(
-    0.01,
-    0.375,
-    results_no_inflation if i.DCA_asset1.cpi_starting == 0 or i.DCA_asset2.cpi_ending == 0 else results,
-    color='white',
-    bbox=dict(
-        facecolor='black',
-        boxstyle='round',
-        edgecolor='white'
-    ),
-    fontsize=9,
-    transform=ax.transAxes
-)
-
-# finalize/save
-plt.tight_layout()
-plt.show()
-# plt.savefig(os.path.join(directory, "3426t343.jpg"))
+    # format y labels
+    ax.set_ylabel('Portfolio Value')
+    ax.grid(axis='y', color='darkgray', linestyle='dotted')
+    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f"${x:,.0f}"))
+
+    # apply legend
+    ax.legend(labelcolor='white', loc='upper left')
+
+    # add creator signature
+    ax.text(.01, .01, 'D. Taygunov', color='white', fontsize=8, style='italic', transform=ax.transAxes)
+
+    # apply summary to text box
+    ax.text(
+        0.01,
+        0.375,
+        summary_text(stats),
+        color='white',
+        bbox=dict(
+            facecolor='black',
+            boxstyle='round',
+            edgecolor='white'
+        ),
+        fontsize=9,
+        transform=ax.transAxes
+    )
+
+    fig.tight_layout()
+    return fig
+
+
+def plot_rolling_entry(plt, stats: dict):
+    """Draws a heatmap of the ROI of every (start week, end week) DCA window, one panel per asset of the pair."""
+    import matplotlib.dates as mdates
+    from matplotlib.colors import TwoSlopeNorm
+
+    from sweep import ParameterSweep
+
+    entry = ParameterSweep(stats['frame'], stats['pair']).rolling_entry(weekly_investment)
+    date_extent = mdates.date2num([entry['dates'][0], entry['dates'][-1]])
+
+    fig_heatmap, heatmap_axes = plt.subplots(1, 2, figsize=[12, 5])
+    for n, (heatmap_ax, asset) in enumerate(zip(heatmap_axes, stats['pair'])):
+        img = heatmap_ax.imshow(
+            entry['roi'][n],
+            origin='lower',
+            aspect='auto',
+            cmap='RdYlGn',
+            norm=TwoSlopeNorm(vmin=-100, vcenter=0, vmax=max(np.nanpercentile(entry['roi'][n], 95), 1)),
+            extent=[*date_extent, *date_extent]
+        )
+        heatmap_ax.xaxis_date()
+        heatmap_ax.yaxis_date()
+        heatmap_ax.set_xlabel('Sell week')
+        heatmap_ax.set_ylabel('First buy week')
+        heatmap_ax.set_title(f'{asset.upper()}: nominal ROI (%) by DCA window', fontsize=12)
+        fig_heatmap.colorbar(img, ax=heatmap_ax)
+    fig_heatmap.tight_layout()
+    return fig_heatmap
+
+
+def render(
+        stats: List[dict],
+        headless: bool = False,
+        output_directory: str = None,
+        formats: Sequence[str] = ('png',),
+        heatmap: bool = rolling_entry_heatmap,
+        max_points: int = MAX_POINTS
+) -> List[str]:
+    """
+    Charts every asset pair. Headless, each chart is written to `output_directory` (one file per format) and closed
+    right away, so any number of pairs can be rendered from one process - otherwise the charts are shown on screen.
+
+    :return: the paths of the files written
+    """
+    plt = _pyplot(headless)
+    if headless:
+        os.makedirs(output_directory, exist_ok=True)
+
+    written = []
+    for pair in stats:
+        figures: Dict[str, object] = {'': plot_pair(plt, pair, max_points)}
+        if heatmap:
+            figures['_rolling_entry'] = plot_rolling_entry(plt, pair)
+
+        if not headless:
+            continue
+        for suffix, fig in figures.items():
+            for fmt in formats:
+                path = os.path.join(output_directory, f'{"_vs_".join(pair["pair"])}{suffix}.{fmt}')
+                fig.savefig(path, format=fmt)
+                written.append(path)
+            plt.close(fig)
+
+    if not headless:
+        plt.show()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the DCA report, and charts the portfolio value of asset pairs.")
+    parser.add_argument('--summary-only', action='store_true', help="print the report only (no plotting imports)")
+    parser.add_argument('--headless', action='store_true', help="write the charts to files instead of showing them")
+    parser.add_argument('--pairs', nargs='+', metavar='ASSET1:ASSET2',
+                        help="asset pairs to chart, ex: btc:xau eth:xau - defaults to the pair in config.py (whose "
+                             "report is printed too)")
+    parser.add_argument('--output-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'charts'),
+                        help="directory the headless charts are written to")
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg'], help="chart file formats")
+    parser.add_argument('--heatmap', action='store_true', default=rolling_entry_heatmap,
+                        help="also chart the ROI of every DCA window (see rolling_entry_heatmap in config.py)")
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS, help="down-sample longer series to this many")
+    args = parser.parse_args()
+
+    if args.summary_only:
+        import importer
+
+        importer.main()
+        return
+
+    if args.pairs:
+        from utils import DataImport
+
+        pairs = [pair.split(':') for pair in args.pairs]
+        if any(len(pair) != 2 for pair in pairs):
+            parser.error("pairs are written as ASSET1:ASSET2, ex: btc:xau")
+
+        # one import for every asset - each file is read once, however many pairs it appears in
+        run = DataImport(
+            os.path.dirname(os.path.abspath(__file__)),
+            list(dict.fromkeys(asset for pair in pairs for asset in pair)),
+            chunk_rows=chunk_rows,
+            ffill_days=ffill_days
+        )
+        stats = [pair_stats(run, pair) for pair in pairs]
+    else:
+        stats = [importer_stats()]
+
+    for path in render(stats, args.headless, args.output_dir, args.format, args.heatmap, args.max_points):
+        print(f"Chart saved to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from sys import exit
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+
+
+def _bootstrap_kernel(
+        first_closes: np.ndarray,
+        log_returns: np.ndarray,
+        n_paths: int,
+        n_weeks: int,
+        block_size: int,
+        weekly_investment: float,
+        seed: np.random.SeedSequence
+) -> np.ndarray:
+    """
+    Generates `n_paths` synthetic price paths by a circular block bootstrap of the weekly log returns, and runs the DCA
+    accumulation over all of them at once. Every block is drawn for all assets jointly (the same weeks), so the
+    correlation between the assets is carried over to the synthetic paths.
+
+    :return: (n_paths x n_assets) ending portfolio values
+    """
+    rng = np.random.default_rng(seed)
+    n_returns = len(log_returns)
+    n_blocks = -(-(n_weeks - 1) // block_size)
+
+    # (n_paths x n_weeks-1) indices of the historical week each synthetic week takes its return from
+    block_starts = rng.integers(0, n_returns, size=(n_paths, n_blocks, 1))
+    weeks = ((block_starts + np.arange(block_size)) % n_returns).reshape(n_paths, -1)[:, :n_weeks - 1]
+
+    # (n_paths x n_weeks-1 x n_assets) weekly closes after the first week - built in place, to keep a chunk's memory
+    # to about one array of that shape
+    closes = log_returns[weeks]
+    np.cumsum(closes, axis=1, out=closes)
+    np.exp(closes, out=closes)
+    closes *= first_closes
+
+    # same rounding as `RunSimulator.rolling_totals`, every path starting from the first historical close - only the
+    # ending units are needed, so the running sum is skipped
+    units = np.broadcast_to(np.round(weekly_investment / first_closes, 2), (n_paths, len(first_closes)))
+    for week in range(n_weeks - 1):
+        units = units + np.round(weekly_investment / closes[:, week], 2)
+    ending_closes = closes[:, -1] if n_weeks > 1 else np.broadcast_to(first_closes, units.shape)
+    return np.round(units * ending_closes, 2)
+
+
+class MonteCarlo:
+    """
+    Turns the single historical path of the weekly price matrix into a distribution of DCA outcomes: the weekly returns
+    of every asset are block-bootstrapped (jointly, so their correlation is preserved) into many synthetic paths, and
+    each path is simulated like `RunSimulator.rolling_totals`.
+
+    Paths are generated in chunks of `chunk_size`, so memory stays bounded however many paths are asked for, and the
+    chunks are spread across a process pool. Each chunk draws from its own child of the seed, so a seeded run gives the
+    same results whatever the number of workers.
+
+    :param df: The DataFrame you created in the `join_dfs_and_pivot_weekly` method of the `DataImport` class
+    :param asset_names: the assets to simulate (ex: ['btc', 'xau'])
+    :param weekly_investment: the static dollar amount invested weekly
+    """
+
+    # paths generated per chunk - about 100 MB of working memory for 2 assets over 10 years of weeks
+    chunk_size = 10_000
+
+    def __init__(self, df: pd.DataFrame, asset_names: Sequence[str], weekly_investment: float) -> None:
+        self.asset_names = list(asset_names)
+        self.weekly_investment = weekly_investment
+
+        # weeks missing a price for any asset (outer joins) can't be bootstrapped jointly
+        closes = df[[f'{asset} Close' for asset in self.asset_names]].to_numpy(dtype=float)
+        self.closes = closes[~np.isnan(closes).any(axis=1)]
+        if len(self.closes) < 2:
+            logging.error("The Monte Carlo simulation needs at least 2 weeks with a price for every asset.")
+            exit(1)
+        self.log_returns = np.diff(np.log(self.closes), axis=0)
+
+    @profiled('monte carlo', rows=lambda result, *_: len(result))
+    def ending_values(
+            self,
+            n_paths: int = 100_000,
+            block_size: int = 4,
+            n_weeks: int = None,
+            seed: int = None,
+            max_workers: int = None
+    ) -> np.ndarray:
+        """
+        Simulates `n_paths` synthetic paths.
+
+        :param n_paths: number of synthetic price paths
+        :param block_size: consecutive weeks per bootstrapped block (longer blocks keep more of the return momentum)
+        :param n_weeks: weeks per path - defaults to the length of the price history
+        :param seed: seed for reproducible paths (None = fresh entropy on every run)
+        :param max_workers: process pool size when there is more than one chunk (defaults to the number of CPUs)
+        :return: (n_paths x n_assets) ending portfolio values
+        """
+        n_weeks = n_weeks if n_weeks is not None else len(self.closes)
+        if n_paths < 1 or n_weeks < 1 or block_size < 1:
+            logging.error("The number of paths, weeks per path and block size must all be at least 1.")
+            exit(1)
+
+        chunks = [min(self.chunk_size, n_paths - offset) for offset in range(0, n_paths, self.chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        args = [
+            (self.closes[0], self.log_returns, n_chunk, n_weeks, block_size, self.weekly_investment, chunk_seed)
+            for n_chunk, chunk_seed in zip(chunks, seeds)
+        ]
+
+        if len(chunks) > 1 and max_workers != 1:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+                return np.concatenate(list(pool.map(_bootstrap_kernel, *zip(*args))))
+        return np.concatenate([_bootstrap_kernel(*chunk_args) for chunk_args in args])
+
+    def run(
+            self,
+            n_paths: int = 100_000,
+            block_size: int = 4,
+            n_weeks: int = None,
+            seed: int = None,
+            percentiles: Sequence[float] = (5, 25, 50, 75, 95),
+            max_workers: int = None
+    ) -> pd.DataFrame:
+        """
+        Returns the percentile bands of the ending value and nominal ROI of every asset, over `n_paths` synthetic paths
+        (see `ending_values` for the parameters).
+
+        :return: (pd.DataFrame) one row per asset and percentile.
+        """
+        n_weeks = n_weeks if n_weeks is not None else len(self.closes)
+        values = self.ending_values(n_paths, block_size, n_weeks, seed, max_workers)
+        invested = n_weeks * self.weekly_investment
+
+        bands = np.percentile(values, percentiles, axis=0)  # (n_percentiles x n_assets)
+        return pd.DataFrame({
+            'Asset': np.tile(self.asset_names, len(percentiles)),
+            'Percentile': np.repeat(percentiles, len(self.asset_names)),
+            'Ending Value': np.round(bands, 2).ravel(),
+            'Nominal ROI': np.round((bands - invested) / invested * 100, 2).ravel(),
+        })
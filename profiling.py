@@ -0,0 +1,84 @@
+import functools
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the report pipeline. Methods decorated with `profiled` record their wall time, the rows
+    they processed and the change in traced memory, aggregated per stage. While disabled (the default), a decorated
+    method costs a single attribute check on top of the call, so the hooks can stay in production code.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.stages: Dict[str, dict] = {}
+        self._started_tracing = False
+
+    def enable(self) -> None:
+        """Starts recording (from a clean slate). Memory is traced with tracemalloc while enabled."""
+        self.enabled = True
+        self.stages = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def disable(self) -> None:
+        """Stops recording - the stages recorded so far are kept for `report`."""
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _run(self, stage: str, rows: Optional[Callable], func: Callable, args: tuple, kwargs: dict):
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - started
+        memory_delta = tracemalloc.get_traced_memory()[0] - memory_before
+
+        record = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'rows': 0, 'memory_delta_mb': 0.0})
+        record['calls'] += 1
+        record['seconds'] += seconds
+        record['rows'] += int(rows(result, *args) if rows is not None else 0)
+        record['memory_delta_mb'] += memory_delta / 2**20
+        return result
+
+    def report(self, results: dict = None) -> dict:
+        """Returns the recorded stages (in the order they first ran), plus the results of the run."""
+        return {'stages': self.stages, 'results': results or {}}
+
+    def to_json(self, results: dict = None) -> str:
+        """Returns `report` as a JSON string - NumPy/pandas values and dates are converted to plain JSON types."""
+        def convert(value):
+            if isinstance(value, np.generic):
+                return value.item()
+            if hasattr(value, 'to_dict'):
+                return value.to_dict()
+            return str(value)
+
+        return json.dumps(self.report(results), default=convert)
+
+
+profiler = Profiler()
+
+
+def profiled(stage: str, rows: Callable = None) -> Callable:
+    """
+    Decorator that records every call of the method as `stage` while the profiler is enabled.
+
+    :param stage: the stage name the call is aggregated under (ex: 'load')
+    :param rows: optional function of (result, *args) returning the number of rows the call processed
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            return profiler._run(stage, rows, func, args, kwargs)
+        return wrapper
+    return decorator
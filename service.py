@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Dict, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from cache import ResultCache
+from config import asset_names as config_asset_names, chunk_rows, ffill_days, result_cache, result_cache_mb, \
+    weekly_investment
+from cpi import CPIStore
+from sweep import ParameterSweep
+from utils import DataImport
+
+
+class QueryService:
+    """
+    Long-running local service answering DCA queries ("what if $75/week since 2018?") from memory. The weekly price
+    matrix of every asset pair asked for and the CPI store are loaded once, so a query only costs one vectorized
+    `ParameterSweep` cell - a few milliseconds instead of a whole script run.
+
+    Queries run on a thread pool, so the event loop keeps accepting connections while one is computed. The .csv files
+    and the CPI store are polled for changes, and reloaded (in the background, then swapped in) when they change.
+
+    GET /simulate?assets=btc,xau&amount=75&start=2018-01-01&end=2024-01-01&cadence=1 - every parameter is optional
+    (defaults: the assets & weekly investment of config.py, the whole date range, weekly buys)
+    GET /assets - the assets available in the data directory
+
+    :param main_directory: the directory holding one .csv file per asset
+    :param asset_names: the assets whose weekly matrix is loaded at startup - any other asset is loaded on first use
+    :param poll_seconds: how often the .csv files are checked for changes
+    """
+
+    def __init__(self, main_directory: str, asset_names: Sequence[str] = None, poll_seconds: float = 2.0) -> None:
+        self.main_directory = main_directory
+        self.asset_names = list(asset_names) if asset_names is not None else list(config_asset_names)
+        self.poll_seconds = poll_seconds
+        # simulated sweeps are kept across reloads & restarts - they are keyed by the content of the price data
+        self._cache = ResultCache(os.path.join(main_directory, '.result_cache'),
+                                  max_disk_bytes=result_cache_mb * 2 ** 20) if result_cache else None
+        self._snapshot = None
+        self._load()
+
+    def _files(self) -> Dict[str, Tuple[int, int]]:
+        """Returns the (size, mtime) of every .csv in the directory, and of the CPI store."""
+        paths = [os.path.join(self.main_directory, _file) for _file in os.listdir(self.main_directory)
+                 if _file.endswith('csv')] + [CPIStore.default_path]
+
+        files = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # no CPI store yet, or a file deleted while listing
+            files[path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def _load(self) -> None:
+        """(Re)loads the data, then swaps it in - queries in flight finish on the data they started with."""
+        snapshot = self._files()
+        run = DataImport(self.main_directory, self.asset_names, chunk_rows=chunk_rows, ffill_days=ffill_days)
+        run.weekly_price_matrix('inner')
+
+        # a single assignment, so a query always sees the price data, CPI & sweeps of the same load - plus the lock of
+        # every pair whose sweep is being built
+        self._data = run, CPIStore(), {}, {}
+        self._snapshot = snapshot
+
+    def _sweep(self, pair: Tuple[str, ...]) -> ParameterSweep:
+        """Returns the (memoized) sweep over the weekly price matrix of these assets."""
+        run, cpi_store, sweeps, locks = self._data
+        sweep = sweeps.get(pair)
+        if sweep is None:
+            # sweeps are built by the query threads, under a lock per pair (setdefault is atomic) - a pair's weekly
+            # matrix is built once, while queries on the pairs already built (or being built) go on
+            with locks.setdefault(pair, threading.Lock()):
+                if pair not in sweeps:
+                    weekly = run.join_dfs_and_pivot_weekly('inner', asset_names=list(pair))
+                    sweeps[pair] = ParameterSweep(weekly, pair, cpi_store, cache=self._cache)
+                sweep = sweeps[pair]
+        return sweep
+
+    def available_assets(self) -> list:
+        """Returns the names of the .csv files in the directory (an asset matches any file containing its name)."""
+        return sorted(_file[:-len('.csv')] for _file in os.listdir(self.main_directory) if _file.endswith('.csv'))
+
+    def query(self, params: Dict[str, str]) -> dict:
+        """
+        Runs one DCA simulation, with `RunSimulator`'s results for every asset.
+
+        :param params: the query string - assets (comma separated), amount, start, end, cadence (weeks between buys)
+        """
+        assets = tuple(asset for asset in params.get('assets', ','.join(self.asset_names)).split(',') if asset)
+        amount = float(params.get('amount', weekly_investment))
+        cadence = int(params.get('cadence', 1))
+        if not assets or amount <= 0 or cadence < 1:
+            raise ValueError("assets must be non-empty, amount positive and cadence at least 1")
+
+        sweep = self._sweep(assets)
+        dates = {name: pd.Timestamp(params[name]) for name in ('start', 'end') if name in params}
+        for name, date in dates.items():
+            if not sweep.covers([date])[0]:
+                raise ValueError(f"{name} {date.date()} is outside the price data of {','.join(assets)} "
+                                 f"({pd.Timestamp(sweep.dates[0]).date()} to {pd.Timestamp(sweep.dates[-1]).date()})")
+
+        results = sweep.run(
+            amounts=[amount],
+            start_dates=[dates['start']] if 'start' in dates else None,
+            end_dates=[dates['end']] if 'end' in dates else None,
+            cadences=[cadence]
+        )
+        # JSON has no NaN - unknown values (ex: the real ROI without CPI data) are null
+        results = results.astype(object).where(results.notna(), None)
+        return {'results': results.to_dict(orient='records')}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # headers are not needed
+
+            if len(request_line) < 2 or request_line[0] != 'GET':
+                status, body = 405, {'error': "only GET requests are supported"}
+            else:
+                try:
+                    status, body = await self._route(request_line[1])
+                except Exception:
+                    # the client still gets a response - the service keeps running
+                    logging.exception(f"Query {request_line[1]} failed.")
+                    status, body = 500, {'error': "internal error - see the service log"}
+
+            payload = json.dumps(body, default=_to_json).encode()
+            writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, target: str) -> Tuple[int, dict]:
+        """Answers the request for `target` (the path & query string)."""
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/simulate':
+            return await self._answer(params)
+        if url.path == '/assets':
+            return 200, {'assets': self.available_assets()}
+        return 404, {'error': f"unknown path {url.path} - use /simulate or /assets"}
+
+    async def _answer(self, params: Dict[str, str]) -> Tuple[int, dict]:
+        """Runs a query on the thread pool, turning bad parameters into a 400 response."""
+        try:
+            return 200, await asyncio.get_running_loop().run_in_executor(None, self.query, params)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': str(e)}
+        except SystemExit:
+            # the data layer exits on unusable input (ex: no .csv for an asset) - the service keeps running
+            return 400, {'error': "the query could not be run - check the asset names and dates"}
+
+    async def _watch(self) -> None:
+        """Reloads the data whenever a .csv file (or the CPI store) changes."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if self._files() != self._snapshot:
+                print("Price data changed - reloading.")
+                try:
+                    await loop.run_in_executor(None, self._load)
+                except SystemExit:
+                    logging.error("Reload failed - still serving the previous data.")
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, unix_path: str = None) -> None:
+        """Serves queries over HTTP, on a TCP port or on a Unix socket, until cancelled."""
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self._handle, path=unix_path)
+            print(f"Serving DCA queries on unix socket {unix_path}")
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+            print(f"Serving DCA queries on http://{host}:{port}/simulate")
+
+        watcher = asyncio.create_task(self._watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat()
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves DCA queries from price data kept in memory.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="serve on this Unix socket instead of a TCP port")
+    parser.add_argument('--poll', type=float, default=2.0, help="seconds between checks for changed .csv files")
+    args = parser.parse_args()
+
+    service = QueryService(os.path.dirname(os.path.abspath(__file__)), poll_seconds=args.poll)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import logging
+from sys import exit
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cpi import CPIStore, cpi_between
+from profiling import profiled
+
+
+class Strategy:
+    """
+    An accumulation strategy, vectorized over a grid of its parameters: every keyword argument takes one value or a
+    list of values, and each combination is one variant. A strategy whose weekly buys only depend on the prices
+    defines `weekly_usd`, and all of its weeks and variants are simulated at once by `kernel`. A path-dependent one
+    (its trades depend on the holdings so far) is advanced week by week by `StrategyEngine`, all its variants at once -
+    `step` gets the (n_variants x n_assets) holdings and returns what every variant trades that week.
+
+    Purchases are rounded to the hundredth of a unit, like in `RunSimulator.rolling_totals`.
+    """
+
+    name = ''
+    # per-asset strategies run on every asset on its own - the others hold all the assets as one portfolio
+    per_asset = True
+    # path-dependent strategies are stepped week by week (see `step`) - the others run in one kernel (see `kernel`)
+    path_dependent = False
+
+    def __init__(self, **params) -> None:
+        grid = np.meshgrid(*[np.atleast_1d(np.asarray(values, dtype=float)) for values in params.values()],
+                           indexing='ij')
+        self.params: Dict[str, np.ndarray] = {key: axis.ravel() for key, axis in zip(params, grid)}
+        self.n_variants = len(next(iter(self.params.values()))) if self.params else 1
+
+    def labels(self) -> List[str]:
+        """Returns a short description of every variant's parameters (ex: 'amount=50, drawdown=20')."""
+        return [', '.join(f'{key}={values[v]:g}' for key, values in self.params.items())
+                for v in range(self.n_variants)]
+
+    def prepare(self, closes: np.ndarray) -> None:
+        """Pre-computes what the strategy derives from the prices alone (ex: running peaks), before the first week."""
+
+    def weekly_usd(self, closes: np.ndarray) -> np.ndarray:
+        """Returns the (n_weeks x n_variants x n_assets) USD every variant puts in each week (path-independent only)."""
+        raise NotImplementedError
+
+    def kernel(self, closes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the (n_variants x n_assets) units held at the end, the USD put in and the USD taken out - every week of
+        every variant bought at once, from `weekly_usd`.
+        """
+        bought, paid = self._buy(self.weekly_usd(closes), closes[:, np.newaxis, :])
+        return bought.sum(axis=0), paid.sum(axis=0), np.zeros(bought.shape[1:])
+
+    def step(self, week: int, closes: np.ndarray, units: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (n_variants x n_assets) units traded this week (negative = sold), and the USD put in (negative =
+        taken out) - `closes` is this week's price of every asset (NaN = no price), `units` the holdings so far.
+        Path-dependent strategies only.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _buy(usd: np.ndarray, closes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Units bought for `usd` at `closes`, rounded like `rolling_totals` - weeks without a price buy nothing."""
+        units = np.nan_to_num(np.round(usd / closes, 2))
+        return units, np.where(np.isnan(closes), 0, usd)
+
+
+class DCA(Strategy):
+    """
+    Fixed dollar amount every week - the strategy of `RunSimulator`, with the same total invested: every week of the
+    date range counts, even the weeks an asset has no price (which buy nothing).
+
+    :param amount: USD invested weekly
+    """
+
+    name = 'dca'
+
+    def __init__(self, amount) -> None:
+        super().__init__(amount=amount)
+
+    def weekly_usd(self, closes):
+        return np.broadcast_to(self.params['amount'][:, np.newaxis],
+                               (len(closes), self.n_variants, closes.shape[1]))
+
+    def kernel(self, closes):
+        units, _, withdrawn = super().kernel(closes)
+        # like `RunSimulator.total_usd_invested` - the amount times the number of weeks
+        return units, np.broadcast_to(self.params['amount'][:, np.newaxis] * len(closes), units.shape), withdrawn
+
+
+class LumpSum(Strategy):
+    """
+    The whole sum a weekly DCA of `amount` would invest over the date range, invested at once in the first week with
+    a price.
+
+    :param amount: the weekly amount it is compared with
+    """
+
+    name = 'lump sum'
+
+    def __init__(self, amount) -> None:
+        super().__init__(amount=amount)
+
+    def prepare(self, closes):
+        priced = ~np.isnan(closes)
+        self.n_priced = priced.sum(axis=0)
+        self.first_week = np.argmax(priced, axis=0)
+
+    def weekly_usd(self, closes):
+        first = (np.arange(len(closes))[:, np.newaxis] == self.first_week)[:, np.newaxis, :]
+        return np.where(first, self.params['amount'][:, np.newaxis] * self.n_priced, 0)
+
+
+class ValueAveraging(Strategy):
+    """
+    Buys whatever it takes for the position to be worth `amount` x the number of weeks so far - more after a fall, less
+    (or nothing) after a rise. With sells, the money taken out is counted apart from the money put in.
+
+    :param amount: the weekly growth of the target value
+    :param allow_sells: sell the excess when the position is above its target (1), or just skip the week (0)
+    """
+
+    name = 'value averaging'
+    path_dependent = True
+
+    def __init__(self, amount, allow_sells=0) -> None:
+        super().__init__(amount=amount, allow_sells=allow_sells)
+
+    def prepare(self, closes):
+        # number of weeks with a price so far, per week and asset
+        self.weeks_priced = np.cumsum(~np.isnan(closes), axis=0)
+
+    def step(self, week, closes, units):
+        target = self.params['amount'][:, np.newaxis] * self.weeks_priced[week]
+        usd = target - units * closes
+        usd = np.where(self.params['allow_sells'][:, np.newaxis] > 0, usd, np.maximum(usd, 0))
+        return self._buy(usd, closes)
+
+
+class BuyTheDip(Strategy):
+    """
+    Weekly DCA that buys `multiplier` times more while the price is at least `drawdown`% below its running peak.
+
+    :param amount: USD invested in a regular week
+    :param drawdown: the fall from the peak (%) that counts as a dip
+    :param multiplier: how many times `amount` is invested in a dip week
+    """
+
+    name = 'buy the dip'
+
+    def __init__(self, amount, drawdown=20, multiplier=2) -> None:
+        super().__init__(amount=amount, drawdown=drawdown, multiplier=multiplier)
+
+    def prepare(self, closes):
+        self.fall = 1 - closes / np.fmax.accumulate(closes, axis=0)
+
+    def weekly_usd(self, closes):
+        dip = self.fall[:, np.newaxis, :] >= self.params['drawdown'][:, np.newaxis] / 100
+        return self.params['amount'][:, np.newaxis] * np.where(dip, self.params['multiplier'][:, np.newaxis], 1)
+
+
+class Rebalanced(Strategy):
+    """
+    One weekly DCA into every asset, split by target weights. Whenever an asset's share of the portfolio drifts more
+    than `threshold` points from its target, the whole portfolio is traded back to the target weights (rebalancing is
+    self-financed, so it doesn't count as money invested). Weeks missing the price of any asset are skipped.
+
+    :param amount: USD invested weekly, across all the assets
+    :param threshold: the drift (in % points of the portfolio) that triggers a rebalance
+    :param weights: the target weight of each asset - equal weights by default
+    """
+
+    name = 'rebalanced'
+    per_asset = False
+    path_dependent = True
+
+    def __init__(self, amount, threshold=5, weights: Sequence[float] = None) -> None:
+        super().__init__(amount=amount, threshold=threshold)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float) / np.sum(weights)
+
+    def prepare(self, closes):
+        if self.weights is None:
+            self.weights = np.full(closes.shape[1], 1 / closes.shape[1])
+        elif len(self.weights) != closes.shape[1]:
+            logging.error("Rebalanced needs one target weight per asset.")
+            exit(1)
+
+    def step(self, week, closes, units):
+        if np.isnan(closes).any():
+            return np.zeros_like(units), np.zeros_like(units)
+
+        usd = self.params['amount'][:, np.newaxis] * self.weights
+        bought, invested = self._buy(usd, closes)
+        holdings = units + bought
+
+        value = holdings * closes
+        total = value.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            drift = np.abs(value / total - self.weights).max(axis=1) * 100
+        rebalance = (drift > self.params['threshold'])[:, np.newaxis]
+
+        target = np.round(total * self.weights / closes, 2)
+        return np.where(rebalance, target - units, bought), invested
+
+
+class StrategyEngine:
+    """
+    Evaluates a whole set of strategies - and every variant of their parameters - together: the path-independent ones
+    (DCA, lump sum, buy-the-dip) in one vectorized kernel each, over all the weeks at once, and the path-dependent ones
+    in a single traversal of the weekly price matrix, where each week every strategy advances all of its variants in
+    one vectorized step. The results hold the same summary stats as `RunSimulator`, so hundreds of variants can be
+    ranked in one run.
+
+    :param df: The DataFrame you created in the `join_dfs_and_pivot_weekly` method of the `DataImport` class
+    :param asset_names: the assets to simulate (ex: ['btc', 'xau'])
+    :param cpi_store: the CPI store used for the real ROI - defaults to the project's cpi_monthly.csv
+    """
+
+    def __init__(self, df: pd.DataFrame, asset_names: Sequence[str], cpi_store: CPIStore = None) -> None:
+        self.asset_names = list(asset_names)
+        self.cpi_store = cpi_store if cpi_store is not None else CPIStore()
+        self.dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+        self.closes = df[[f'{asset} Close' for asset in self.asset_names]].to_numpy(dtype=float)
+
+    @profiled('strategies', rows=lambda result, *_: len(result))
+    def run(self, strategies: Sequence[Strategy], inflation_rate: float = None) -> pd.DataFrame:
+        """
+        Simulates every variant of every strategy over the whole date range.
+
+        :param strategies: the strategies to compare (ex: [DCA(50), BuyTheDip(50, drawdown=[10, 20, 30])])
+        :param inflation_rate: the inflation rate (%) used for the real ROI - by default, the CPI change between the
+                               first and last week (the real ROI is left empty if either CPI is unknown)
+        :return: (pd.DataFrame) one row per variant and asset (one per variant for portfolio strategies), ranked by
+                 nominal ROI.
+        """
+        n_weeks, n_assets = self.closes.shape
+        for strategy in strategies:
+            strategy.prepare(self.closes)
+
+        # (units, USD put in, USD taken out) of every variant & asset, per strategy
+        totals = [strategy.kernel(self.closes) if not strategy.path_dependent
+                  else tuple(np.zeros((strategy.n_variants, n_assets)) for _ in range(3)) for strategy in strategies]
+        stepped = [k for k, strategy in enumerate(strategies) if strategy.path_dependent]
+        # one pass over the weeks - every path-dependent strategy steps all of its variants at once
+        for week in range(n_weeks if stepped else 0):
+            for k in stepped:
+                units, contributed, withdrawn = totals[k]
+                traded, paid = strategies[k].step(week, self.closes[week], units)
+                units += traded
+                contributed += np.maximum(paid, 0)
+                withdrawn -= np.minimum(paid, 0)
+
+        if inflation_rate is None:
+            cpi_starting, cpi_ending = self.cpi_store.lookup_dates(self.dates[[0, -1]])
+            inflation_rate = np.nan if np.isnan(cpi_starting) or np.isnan(cpi_ending) \
+                else cpi_between(cpi_starting, cpi_ending)[()]
+
+        rows = []
+        for strategy, (units, contributed, withdrawn) in zip(strategies, totals):
+            value = np.round(units * self.closes[-1], 2)
+            labels = strategy.labels()
+            if strategy.per_asset:
+                for a, asset in enumerate(self.asset_names):
+                    rows += [(strategy.name, labels[v], asset, contributed[v, a], withdrawn[v, a], units[v, a],
+                              value[v, a]) for v in range(strategy.n_variants)]
+            else:
+                rows += [(strategy.name, labels[v], '+'.join(self.asset_names), contributed[v].sum(),
+                          withdrawn[v].sum(), np.nan, value[v].sum()) for v in range(strategy.n_variants)]
+
+        results = pd.DataFrame(rows, columns=['Strategy', 'Parameters', 'Asset', 'Total Invested', 'Total Withdrawn',
+                                              'Units', 'Ending Value'])
+        results[['Total Invested', 'Total Withdrawn', 'Units']] = \
+            results[['Total Invested', 'Total Withdrawn', 'Units']].round(2)
+        # same formulas as `RunSimulator.nominal_roi` / `real_roi` / `usd_return_inflation_adjusted` - the money taken
+        # out (value averaging with sells) counts towards the return, the money put in is the gross contributions
+        results['Nominal ROI'] = np.round((results['Ending Value'] + results['Total Withdrawn']
+                                           - results['Total Invested']) / results['Total Invested'] * 100, 2)
+        results['Real ROI'] = np.round(((1 + results['Nominal ROI'] / 100) / (1 + inflation_rate / 100) - 1) * 100, 2)
+        results['Real USD Return'] = np.round(results['Total Invested'] * (1 + results['Real ROI'] / 100), 2)
+        return results.sort_values('Nominal ROI', ascending=False, ignore_index=True)
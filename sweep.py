@@ -0,0 +1,337 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from sys import exit
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cache import ResultCache, array_hash
+from cpi import CPIStore, cpi_between
+from export import open_table, write_chunks
+from profiling import profiled
+
+# the columns of a sweep grid (see `ParameterSweep.build_grid`)
+GRID_COLUMNS = ('amount', 'start', 'end', 'cadence')
+
+
+def _strided_cumsum(purchases: np.ndarray, cadence: int) -> np.ndarray:
+    """
+    Running total of every `cadence`-th week along axis 1, so that out[:, w] = purchases[:, w] + purchases[:, w-cadence]
+    + purchases[:, w-2*cadence] + ... The weeks are folded into (n_weeks/cadence x cadence) blocks, so that a single
+    cumsum covers every buying phase at once.
+    """
+    n_amounts, n_weeks, n_assets = purchases.shape
+    padded_weeks = -(-n_weeks // cadence) * cadence
+    padded = np.zeros((n_amounts, padded_weeks, n_assets))
+    padded[:, :n_weeks] = purchases
+    folded = padded.reshape(n_amounts, padded_weeks // cadence, cadence, n_assets)
+    return np.cumsum(folded, axis=1).reshape(n_amounts, padded_weeks, n_assets)[:, :n_weeks]
+
+
+def _sweep_kernel(
+        closes: np.ndarray,
+        amounts: np.ndarray,
+        start_idx: np.ndarray,
+        end_idx: np.ndarray,
+        cadences: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Simulates every grid cell against the (n_weeks x n_assets) price matrix. Purchases are rounded the same way as in
+    `RunSimulator.rolling_totals`, so a full-range, weekly cell reproduces its results exactly.
+
+    :return: dict of (n_cells x n_assets) arrays - 'units', 'value' - plus the (n_cells) 'invested' array
+    """
+    units = np.empty((len(amounts), closes.shape[1]))
+
+    # every distinct amount is priced against every week in one broadcast (n_amounts x n_weeks x n_assets)
+    unique_amounts, amount_pos = np.unique(amounts, return_inverse=True)
+    purchases = np.nan_to_num(np.round(unique_amounts[:, np.newaxis, np.newaxis] / closes[np.newaxis], 2))
+
+    n_buys = (end_idx - start_idx) // cadences + 1
+    last_buy = start_idx + (n_buys - 1) * cadences
+    week_before = start_idx - cadences
+
+    for cadence in np.unique(cadences):
+        cells = cadences == cadence
+        running_units = _strided_cumsum(purchases, cadence)
+
+        # units bought between the start and end week = running total at the last buy - running total before the start
+        bought_by_end = running_units[amount_pos[cells], last_buy[cells]]
+        bought_before_start = running_units[amount_pos[cells], np.maximum(week_before[cells], 0)]
+        units[cells] = bought_by_end - np.where((week_before[cells] >= 0)[:, np.newaxis], bought_before_start, 0)
+
+    return {
+        'units': units,
+        'value': np.round(units * closes[end_idx], 2),
+        'invested': np.round(n_buys * amounts, 2),
+    }
+
+
+class ParameterSweep:
+    """
+    Runs a whole grid of DCA scenarios (investment amount x start date x end date x cadence) in one vectorized pass over
+    the weekly price matrix, instead of re-running `RunSimulator.rolling_totals` once per scenario.
+
+    :param df: The DataFrame you created in the `join_dfs_and_pivot_weekly` method of the `DataImport` class
+    :param asset_names: the assets to simulate (ex: ['btc', 'xau'])
+    :param cpi_store: the CPI store used for the real ROI of each cell - defaults to the project's cpi_monthly.csv
+    :param cache: keeps the simulated shards of every grid (keyed by the content of the price matrix and of the
+                  shard's cells), so a sweep run again isn't simulated again - see `cache.ResultCache`
+    """
+
+    # grids with more cells than this are sharded across a process pool
+    shard_size = 50_000
+
+    def __init__(
+            self,
+            df: pd.DataFrame,
+            asset_names: Sequence[str],
+            cpi_store: CPIStore = None,
+            cache: ResultCache = None
+    ) -> None:
+        self.asset_names = list(asset_names)
+        self.cpi_store = cpi_store if cpi_store is not None else CPIStore()
+        self.dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+        self.closes = df[[f'{asset} Close' for asset in self.asset_names]].to_numpy(dtype=float)
+        self.cache = cache
+        self._prices_hash = None if cache is None else array_hash(self.dates, self.closes)
+
+    def _week_index(self, dates) -> np.ndarray:
+        """
+        Returns the index of the week each date falls in (weeks are labelled by the Monday that closes them) - -1 for
+        the dates before the first week or after the last week of the df.
+        """
+        dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]')
+        if not len(self.dates):
+            return np.full(len(dates), -1)
+
+        week_idx = np.searchsorted(self.dates, dates, side='left')
+        outside = (week_idx == len(self.dates)) | (dates <= self.dates[0] - np.timedelta64(7, 'D'))
+        return np.where(outside, -1, week_idx)
+
+    def covers(self, dates) -> np.ndarray:
+        """Returns whether each date falls in one of the weeks of the df."""
+        return self._week_index(dates) >= 0
+
+    def build_grid(
+            self,
+            amounts: Sequence[float],
+            start_dates: Sequence = None,
+            end_dates: Sequence = None,
+            cadences: Sequence[int] = (1,)
+    ) -> Dict[str, np.ndarray]:
+        """
+        Returns every combination of the sweep parameters as flat arrays, one entry per grid cell. Dates are snapped to
+        the week they fall in - cells starting or ending outside the weeks of the df, or whose start week comes after
+        their end week, are dropped.
+
+        :param amounts: the dollar amounts invested on each buy
+        :param start_dates: the dates of the first buy - defaults to the first week of the df
+        :param end_dates: the dates the position is valued (market sell) - defaults to the last week of the df
+        :param cadences: the number of weeks between buys (1 = weekly, 2 = bi-weekly, 4 = ~monthly)
+        """
+        start_idx = self._week_index(start_dates) if start_dates is not None else np.array([0])
+        end_idx = self._week_index(end_dates) if end_dates is not None else np.array([len(self.dates) - 1])
+        cadences = np.asarray(cadences, dtype=int)
+
+        if (cadences < 1).any():
+            logging.error("Cadences must be a whole number of weeks, of at least 1.")
+            exit(1)
+
+        grid = np.meshgrid(np.asarray(amounts, dtype=float), start_idx, end_idx, cadences, indexing='ij')
+        amount, start, end, cadence = (axis.ravel() for axis in grid)
+        valid = (start >= 0) & (end >= 0) & (start <= end)
+
+        return {'amount': amount[valid], 'start': start[valid], 'end': end[valid], 'cadence': cadence[valid]}
+
+    @profiled('sweep', rows=lambda result, *_: len(result))
+    def run(
+            self,
+            amounts: Sequence[float],
+            start_dates: Sequence = None,
+            end_dates: Sequence = None,
+            cadences: Sequence[int] = (1,),
+            inflation_rate: float = None,
+            max_workers: int = None
+    ) -> pd.DataFrame:
+        """
+        Simulates every cell of the parameter grid (see `build_grid`), for every asset.
+
+        :param inflation_rate: a fixed inflation rate (%) for the real ROI of every cell - by default, each cell uses
+                               the CPI of its own start and end month (its real ROI is left empty if either is unknown)
+        :param max_workers: process pool size for grids larger than `shard_size` (defaults to the number of CPUs)
+        :return: (pd.DataFrame) one row per grid cell and asset.
+        """
+        frames = list(self.iter_run(amounts, start_dates, end_dates, cadences, inflation_rate, max_workers))
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    @profiled('sweep export', rows=lambda result, *_: result)
+    def export(
+            self,
+            output_path: str,
+            amounts: Sequence[float],
+            start_dates: Sequence = None,
+            end_dates: Sequence = None,
+            cadences: Sequence[int] = (1,),
+            inflation_rate: float = None,
+            max_workers: int = None,
+            fmt: str = None
+    ) -> int:
+        """
+        Same as `run`, but every shard of the grid is written to `output_path` (.csv, .parquet or .arrow) as soon as
+        it is simulated, so the size of the grid isn't bounded by memory.
+
+        :param fmt: 'csv', 'parquet' or 'arrow' - defaults to the extension of `output_path`
+        :return: the number of rows written
+        """
+        with open_table(output_path, fmt) as writer:
+            return write_chunks(writer, self.iter_run(amounts, start_dates, end_dates, cadences, inflation_rate,
+                                                      max_workers))
+
+    def iter_run(
+            self,
+            amounts: Sequence[float],
+            start_dates: Sequence = None,
+            end_dates: Sequence = None,
+            cadences: Sequence[int] = (1,),
+            inflation_rate: float = None,
+            max_workers: int = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields the results of `run` shard by shard (`shard_size` cells at most), in grid order, as each one is
+        simulated - grids larger than one shard are simulated across a process pool. With a cache, the cells it
+        doesn't hold are simulated first.
+        """
+        shards = self._shards(self.build_grid(amounts, start_dates, end_dates, cadences))
+        if self.cache is None:
+            for shard, result in self._simulate(shards, max_workers):
+                yield self._results_frame(shard, result, inflation_rate)
+        else:
+            yield from self._cached_run(shards, inflation_rate, max_workers)
+
+    def _shards(self, grid: Dict[str, np.ndarray]) -> List[Dict[str, np.ndarray]]:
+        """Splits the grid into shards of `shard_size` cells at most, in grid order (an empty grid is one shard)."""
+        n_cells = len(grid['amount'])
+        return [
+            {key: values[offset:offset + self.shard_size] for key, values in grid.items()}
+            for offset in range(0, max(n_cells, 1), self.shard_size)
+        ]
+
+    def _simulate(self, shards: List[Dict[str, np.ndarray]], max_workers: int = None) -> Iterator[Tuple[dict, dict]]:
+        """
+        Yields every shard with its `_sweep_kernel` results, in order, as each one is simulated - several shards are
+        simulated across a process pool.
+        """
+        if len(shards) == 1:
+            yield shards[0], _sweep_kernel(self.closes, *(shards[0][column] for column in GRID_COLUMNS))
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            results = pool.map(
+                _sweep_kernel,
+                *zip(*[(self.closes, s['amount'], s['start'], s['end'], s['cadence']) for s in shards])
+            )
+            # results come back in order, as the workers finish them
+            yield from zip(shards, results)
+
+    def _cached_run(
+            self,
+            shards: List[Dict[str, np.ndarray]],
+            inflation_rate: float = None,
+            max_workers: int = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Same as `iter_run`, but the `_sweep_kernel` results of every shard are one cache entry, keyed by the price
+        matrix and the shard's cells - only the shards missing from the cache are simulated (across the process pool,
+        like `_simulate`). The real ROI is worked out on every run, as the CPI store may have changed.
+        """
+        keys = [self.cache.key('sweep', self._prices_hash, self.asset_names,
+                               array_hash(*(shard[column] for column in GRID_COLUMNS))) for shard in shards]
+        missing = [key not in self.cache for key in keys]
+        simulated = self._simulate([shard for shard, miss in zip(shards, missing) if miss], max_workers)
+
+        try:
+            for shard, key, miss in zip(shards, keys, missing):
+                result = None if miss else self.cache.get(key)
+                if miss:
+                    _, result = next(simulated)
+                    self.cache.put(key, result)
+                elif result is None:
+                    # evicted since it was looked up
+                    result = _sweep_kernel(self.closes, *(shard[column] for column in GRID_COLUMNS))
+                yield self._results_frame(shard, result, inflation_rate)
+        finally:
+            # shuts the process pool down
+            simulated.close()
+
+    def _results_frame(self, grid: Dict[str, np.ndarray], result: Dict[str, np.ndarray],
+                       inflation_rate: float = None) -> pd.DataFrame:
+        """Returns the results of the grid cells simulated by `_sweep_kernel` - one row per cell and asset."""
+        if inflation_rate is None:
+            # one vectorized lookup for the CPI of every cell's start and end month
+            cpi_starting = self.cpi_store.lookup_dates(self.dates[grid['start']])
+            cpi_ending = self.cpi_store.lookup_dates(self.dates[grid['end']])
+            inflation_rate = np.where(np.isnan(cpi_starting) | np.isnan(cpi_ending), np.nan,
+                                      cpi_between(cpi_starting, cpi_ending))[:, np.newaxis]
+
+        invested = result['invested'][:, np.newaxis]
+        nominal_roi = np.round((result['value'] - invested) / invested * 100, 2)
+        real_roi = np.round(((1 + nominal_roi / 100) / (1 + inflation_rate / 100) - 1) * 100, 2)
+
+        n_assets = len(self.asset_names)
+        n_cells = len(grid['amount'])
+        return pd.DataFrame({
+            'Amount': np.repeat(grid['amount'], n_assets),
+            'Start': np.repeat(self.dates[grid['start']], n_assets),
+            'End': np.repeat(self.dates[grid['end']], n_assets),
+            'Cadence': np.repeat(grid['cadence'], n_assets),
+            'Asset': np.tile(self.asset_names, n_cells),
+            'Total Invested': np.repeat(result['invested'], n_assets),
+            'Units': result['units'].round(2).ravel(),
+            'Ending Value': result['value'].ravel(),
+            'Nominal ROI': nominal_roi.ravel(),
+            'Real ROI': real_roi.ravel(),
+        })
+
+    @profiled('rolling entry')
+    def rolling_entry(self, weekly_investment: float) -> Dict[str, np.ndarray]:
+        """
+        Answers "what if I had started (and stopped) DCA-ing in any given week?" for every (start, end) window at once.
+        Units held over a window are the difference of two entries of the cumulative sum of `weekly_investment / Close`,
+        so each window costs O(1) instead of a `rolling_totals` run per start week.
+
+        :return: dict holding the week labels ('dates'), and three (n_assets x n_weeks x n_weeks) float32 arrays indexed
+                 [asset, start week, end week] - 'value' (ending value), 'roi' (nominal ROI %) and 'drawdown' (largest
+                 peak-to-trough fall of the portfolio value within the window, %). Windows ending before they start
+                 are NaN.
+        """
+        n_weeks, n_assets = self.closes.shape
+        weeks = np.arange(n_weeks)
+        # windows[s, e] is True when the window starting on week s and ending on week e is valid
+        windows = weeks[np.newaxis, :] >= weeks[:, np.newaxis]
+        invested = np.where(windows, (weeks[np.newaxis, :] - weeks[:, np.newaxis] + 1) * weekly_investment, np.nan)
+
+        value = np.empty((n_assets, n_weeks, n_weeks), dtype=np.float32)
+        roi = np.empty_like(value)
+        drawdown = np.empty_like(value)
+
+        for i in range(n_assets):
+            closes = self.closes[:, i]
+            # same rounding as `RunSimulator.rolling_totals`, weeks without a price buy nothing
+            running_units = np.cumsum(np.nan_to_num(np.round(weekly_investment / closes, 2)))
+            units_before = np.concatenate([[0], running_units[:-1]])
+
+            window_value = np.round((running_units[np.newaxis, :] - units_before[:, np.newaxis]) * closes, 2)
+            window_value[~windows] = np.nan
+
+            peak = np.fmax.accumulate(window_value, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fall = np.nan_to_num(1 - window_value / peak)
+
+            value[i] = window_value
+            roi[i] = np.round((window_value - invested) / invested * 100, 2)
+            drawdown[i] = np.where(windows, np.round(np.maximum.accumulate(fall, axis=1) * 100, 2), np.nan)
+
+        return {'dates': self.dates, 'value': value, 'roi': roi, 'drawdown': drawdown}
@@ -0,0 +1,31 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# the sample price files shipped with the project
+SAMPLE_FILES = {'btc': 'btc_v_d.csv', 'xau': 'xauusd_d(2).csv'}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A directory holding a copy of the sample btc & xau price files."""
+    for file_name in SAMPLE_FILES.values():
+        shutil.copy(os.path.join(ROOT, file_name), tmp_path / file_name)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def write_prices(tmp_path):
+    """Writes a price .csv file (Date & Close columns) into the temporary directory, and returns its path."""
+    def write(file_name: str, dates, closes) -> str:
+        path = tmp_path / file_name
+        pd.DataFrame({'Date': pd.to_datetime(dates).strftime('%Y-%m-%d'), 'Close': closes}).to_csv(path, index=False)
+        return str(path)
+
+    return write
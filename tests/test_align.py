@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import service
+from batch import BatchScheduler
+from conftest import SAMPLE_FILES
+from utils import DataImport
+
+ASSETS = list(SAMPLE_FILES)
+
+
+def _closes(run):
+    return [asset_df.set_index('Date')['Close'].rename(asset) for asset, asset_df in zip(ASSETS, run.imported_df)]
+
+
+def test_forward_filled_inner_join_keeps_weekends_within_the_shared_range(data_dir):
+    closes = _closes(DataImport(data_dir, ASSETS))
+    same_day = DataImport.align_closes(closes, 'inner')
+    filled = DataImport.align_closes(closes, 'inner', ffill_days=3)
+
+    # xau doesn't trade on weekends - its last close (Friday's, unless it was a holiday) is carried over them
+    assert (same_day.index.dayofweek < 5).all()
+    saturdays = filled.index[filled.index.dayofweek == 5]
+    assert len(saturdays) > 400
+    np.testing.assert_array_equal(filled.loc[saturdays, 'xau'], closes[1].asof(saturdays))
+    assert not filled.isna().any().any()
+
+    # trimmed to the range both assets cover - not carried past the last xau close
+    assert filled.index[0] == max(series.index[0] for series in closes)
+    assert filled.index[-1] == min(series.index[-1] for series in closes)
+
+
+def test_forward_filling_changes_the_inner_join_reports(data_dir, monkeypatch):
+    same_day = DataImport(data_dir, ASSETS).simulate(50, 'inner').result
+    filled = DataImport(data_dir, ASSETS, ffill_days=3).simulate(50, 'inner').result
+    # the weekly means now take btc's weekend prices in (and xau's Friday close, carried over the weekend)
+    assert not np.array_equal(same_day.closes[:, 0], filled.closes[:, 0])
+
+    # batch reports align each pair the same way
+    batch = BatchScheduler(data_dir, weekly_investment=50, ffill_days=3, max_workers=1).run().set_index('Asset')
+    np.testing.assert_array_equal(batch['Ending Value'], filled.ending_investment_value())
+
+    # ... and so do service queries
+    monkeypatch.setattr(service, 'ffill_days', 3)
+    answer = service.QueryService(data_dir, ASSETS).query({'amount': '50'})['results']
+    assert [row['Ending Value'] for row in answer] == pytest.approx(list(filled.ending_investment_value()), abs=0.01)
@@ -0,0 +1,30 @@
+import os
+
+import pandas as pd
+
+import batch
+from batch import BatchScheduler
+
+
+def test_only_the_assets_of_the_requested_pairs_are_read(tmp_path, write_prices, monkeypatch):
+    dates = pd.date_range('2019-01-01', periods=500)
+    for asset in ('aaa', 'bbb', 'ccc'):
+        write_prices(f'{asset}.csv', dates, range(1, 501))
+    (tmp_path / 'broken.csv').write_text('Date,Open\n2019-01-01,1\n')
+
+    read = []
+    read_price_csv = batch.read_price_csv
+    monkeypatch.setattr(batch, 'read_price_csv', lambda path: read.append(os.path.basename(path)) or
+                        read_price_csv(path))
+
+    scheduler = BatchScheduler(str(tmp_path), max_workers=1)
+    results = scheduler.run([('aaa', 'bbb')])
+    assert sorted(read) == ['aaa.csv', 'bbb.csv']
+    assert list(results['Asset']) == ['aaa', 'bbb']
+    # the malformed file isn't part of the run, so it isn't reported either
+    assert scheduler.skipped == []
+
+    read.clear()
+    scheduler.run()
+    assert sorted(read) == ['aaa.csv', 'bbb.csv', 'broken.csv', 'ccc.csv']
+    assert [name for name, _ in scheduler.skipped] == ['broken.csv']
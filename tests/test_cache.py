@@ -0,0 +1,35 @@
+import pandas as pd
+
+import utils
+from cache import PriceCache
+from utils import DataImport
+
+
+def test_rows_appended_while_a_file_is_parsed_are_not_cached_as_read(tmp_path, write_prices, monkeypatch):
+    path = write_prices('btc_usd.csv', pd.date_range('2020-01-01', periods=400), range(400))
+    read_csv = pd.read_csv
+
+    def read_csv_then_append(*args, **kwargs):
+        # a new row lands between reading the file and caching its parse
+        with open(path, 'a') as f:
+            f.write('2021-02-04,400\n')
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(utils.pd, 'read_csv', read_csv_then_append)
+    assert len(DataImport(str(tmp_path), ['btc'])._loaded(['btc'])[0]) == 400
+    monkeypatch.undo()
+
+    assert not PriceCache(path).is_fresh()
+    assert len(DataImport(str(tmp_path), ['btc'])._loaded(['btc'])[0]) == 401
+    assert PriceCache(path).is_fresh()
+
+
+def test_touched_but_unchanged_files_stay_cached(tmp_path, write_prices):
+    path = write_prices('btc_usd.csv', pd.date_range('2020-01-01', periods=400), range(400))
+    DataImport(str(tmp_path), ['btc'])._loaded(['btc'])
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path, 'wb') as f:
+        f.write(content)
+    assert PriceCache(path).is_fresh()
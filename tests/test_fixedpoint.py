@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental import IncrementalState
+from utils import DataImport, RunSimulator
+
+
+@pytest.fixture
+def sub_cent_dir(tmp_path, write_prices):
+    """Two years of daily prices - 'shib' is worth a few thousandths of a cent."""
+    dates = pd.date_range('2022-01-03', periods=730, freq='D')
+    rng = np.random.default_rng(0)
+    write_prices('shib_usd.csv', dates, np.round(0.00001 * np.exp(np.cumsum(rng.normal(0, 0.03, len(dates)))), 10))
+    write_prices('btc_usd.csv', dates, np.round(30000 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates)))), 2))
+    return str(tmp_path)
+
+
+def test_exact_accounting_counts_sub_cent_prices_in_their_own_decimals(sub_cent_dir):
+    run = DataImport(sub_cent_dir, ['shib', 'btc'])
+    simulator = run.simulate(50, 'inner', unit_decimals={'shib': 0, 'btc': 8}, price_decimals={'shib': 10})
+    result = simulator.result
+
+    # the weekly means are quantized at 10 decimals for shib, at cents for btc - not rounded to cents first
+    unrounded = run.join_dfs_and_pivot_weekly('inner', round_to=None)
+    np.testing.assert_array_equal(result.closes[:, 0], np.round(unrounded['shib Close'].to_numpy() * 1e10))
+    np.testing.assert_array_equal(result.closes[:, 1], np.round(unrounded['btc Close'].to_numpy() * 100))
+    assert (run.join_dfs_and_pivot_weekly('inner')['shib Close'] == 0).all()
+
+    # every week buys the whole shib the $50 affords at that price
+    shib_closes = result.closes[:, 0] / 1e10
+    assert simulator.total_asset_purchased()['shib'] == pytest.approx(np.floor(50 / shib_closes).sum(), rel=1e-9)
+
+
+# the state's float running totals divide by shib's weekly prices rounded to the cent (0)
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_incremental_exact_accounting_gets_the_unrounded_weekly_means(sub_cent_dir):
+    state = IncrementalState.from_directory(sub_cent_dir, ['shib', 'btc'], 50)
+    state.update()
+    run = DataImport(sub_cent_dir, ['shib', 'btc'])
+
+    pd.testing.assert_frame_equal(state.to_pivot(round_to=None), run.join_dfs_and_pivot_weekly('inner', round_to=None),
+                                  check_exact=True, check_dtype=False)
+    exact = dict(unit_decimals={'shib': 0}, price_decimals={'shib': 10})
+    incremental = RunSimulator(state.to_pivot(round_to=None), ['shib', 'btc'], 50, **exact).rolling_totals()
+    np.testing.assert_array_equal(incremental.units, run.simulate(50, 'inner', **exact).result.units)
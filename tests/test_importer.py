@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+import importer
+
+
+def _exported(directory):
+    return {name: open(os.path.join(directory, name), 'rb').read() for name in sorted(os.listdir(directory))}
+
+
+@pytest.mark.parametrize('exact_accounting', [False, True])
+def test_cached_report_exports_the_same_tables(data_dir, monkeypatch, exact_accounting):
+    monkeypatch.setattr(importer, 'export_format', 'csv')
+    monkeypatch.setattr(importer, 'exact_accounting', exact_accounting)
+    output_dir = os.path.join(data_dir, 'Raw Data')
+
+    cold = importer.run_report(data_dir)
+    cold_export = _exported(output_dir)
+    assert any(name.startswith('simulation_') for name in cold_export)
+
+    warm = importer.run_report(data_dir)
+    assert os.listdir(os.path.join(data_dir, '.result_cache'))
+    assert repr(warm) == repr(cold)
+    assert _exported(output_dir) == cold_export
@@ -0,0 +1,66 @@
+import builtins
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SAMPLE_FILES
+from incremental import IncrementalState
+from utils import DataImport
+
+ASSETS = list(SAMPLE_FILES)
+
+
+@pytest.mark.parametrize('join_method, ffill_days', [('inner', 0), ('outer', 0), ('outer', 3), ('left', 2),
+                                                     ('inner', 3)])
+@pytest.mark.parametrize('chunk_rows', [97, 1000])
+def test_chunked_ingest_matches_the_full_pivot(data_dir, join_method, ffill_days, chunk_rows):
+    full = DataImport(data_dir, ASSETS, ffill_days=ffill_days)
+    chunked = DataImport(data_dir, ASSETS, chunk_rows=chunk_rows, ffill_days=ffill_days)
+
+    pd.testing.assert_frame_equal(chunked.join_dfs_and_pivot_weekly(join_method),
+                                  full.join_dfs_and_pivot_weekly(join_method), check_exact=True)
+    assert chunked.determine_date_range() == full.determine_date_range()
+
+
+@pytest.fixture
+def csv_reads(monkeypatch):
+    """Records the name of every .csv file opened."""
+    reads = []
+    _open = builtins.open
+
+    def recording_open(file, *args, **kwargs):
+        if isinstance(file, str) and file.endswith('.csv'):
+            reads.append(os.path.basename(file))
+        return _open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', recording_open)
+    return reads
+
+
+def test_each_csv_is_read_once_and_not_at_all_on_warm_starts(data_dir, csv_reads):
+    # a file named after btc, without a Close column - skipped on its one read
+    pd.DataFrame({'Date': ['2020-01-01'], 'Note': ['x']}).to_csv(os.path.join(data_dir, 'btc_a_notes.csv'), index=False)
+    csv_reads.clear()
+
+    cold = DataImport(data_dir, ASSETS)
+    cold.price_hash()
+    cold.determine_date_range()
+    cold.simulate(50, join_method='inner')
+    assert sorted(csv_reads) == sorted(['btc_a_notes.csv', *SAMPLE_FILES.values()])
+
+    csv_reads.clear()
+    warm = DataImport(data_dir, ASSETS)
+    warm.price_hash()
+    warm.simulate(50, join_method='inner')
+    assert csv_reads == ['btc_a_notes.csv']
+    np.testing.assert_array_equal(warm.simulate(50, 'inner').result.value, cold.simulate(50, 'inner').result.value)
+
+
+def test_incremental_state_matches_files_like_the_data_layer(data_dir):
+    pd.DataFrame({'Date': ['2020-01-01'], 'Note': ['x']}).to_csv(os.path.join(data_dir, 'btc_a_notes.csv'), index=False)
+
+    state = IncrementalState.from_directory(data_dir, ASSETS, 50)
+    run = DataImport(data_dir, ASSETS)
+    assert state.csv_paths == run._csv_paths(ASSETS) == [os.path.join(data_dir, name) for name in SAMPLE_FILES.values()]
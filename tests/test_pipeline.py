@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+import pytest
+
+import utils
+from conftest import SAMPLE_FILES
+from utils import DataImport, RunSimulator
+
+ASSETS = list(SAMPLE_FILES)
+
+
+def _eager_frame(data_dir, join_method, ffill_days=0):
+    """Every stage run by hand, straight from the .csv files - no memo, no cache."""
+    closes = []
+    for asset, file_name in SAMPLE_FILES.items():
+        asset_df = pd.read_csv(os.path.join(data_dir, file_name), encoding='latin1')
+        closes.append(asset_df.set_index(pd.to_datetime(asset_df['Date']))['Close'].rename(asset))
+    weekly = DataImport.resample_weekly(DataImport.align_closes(closes, join_method, ffill_days))
+
+    piv = pd.DataFrame(weekly.to_numpy(dtype=float), columns=[f'{asset} Close' for asset in ASSETS])
+    piv.insert(0, 'Date', weekly.index.to_numpy())
+    return RunSimulator(piv, ASSETS, 50).rolling_totals().to_frame()
+
+
+@pytest.mark.parametrize('ffill_days', [0, 3])
+def test_memoized_pipeline_matches_eager_stages(data_dir, ffill_days):
+    run = DataImport(data_dir, ASSETS, ffill_days=ffill_days)
+    # stages asked for out of order, and twice - each is built once, then read from the memo
+    outer = run.simulate(50, join_method='outer')
+    date_range = run.determine_date_range()
+    inner = run.simulate(50, join_method='inner')
+    assert run.simulate(50, join_method='outer') is outer
+    assert run.determine_date_range() == date_range
+
+    for join_method, simulator in (('outer', outer), ('inner', inner)):
+        pd.testing.assert_frame_equal(simulator.result.to_frame(), _eager_frame(data_dir, join_method, ffill_days),
+                                      check_exact=True)
+
+
+def test_each_file_is_loaded_once(data_dir, monkeypatch):
+    loaded = []
+    read_price_csv = utils.read_price_csv
+    monkeypatch.setattr(utils, 'read_price_csv', lambda path, use_cache=True: loaded.append(path) or
+                        read_price_csv(path, use_cache))
+
+    run = DataImport(data_dir, ASSETS)
+    run.determine_date_range()
+    run.simulate(50, join_method='inner')
+    run.simulate(50, join_method='outer')
+    run.determine_date_range(['xau'])
+    assert sorted(map(os.path.basename, loaded)) == sorted(SAMPLE_FILES.values())
@@ -0,0 +1,31 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from utils import SimulationResult
+
+
+def _result():
+    dates = np.array(['2024-01-01', '2024-01-08', '2024-01-15'], dtype='datetime64[ns]')
+    closes = np.array([[100., 10.], [np.nan, 20.], [50., 40.]])
+    purchases = np.round(50 / closes, 2)
+    units = np.cumsum(np.nan_to_num(purchases), axis=0)
+    return SimulationResult(['a', 'b'], dates, closes, purchases, units, np.round(units * closes, 2), 50), dates
+
+
+@pytest.mark.parametrize('restore', [lambda result: result, lambda result: pickle.loads(pickle.dumps(result))])
+def test_result_arrays_and_summaries_are_read_only(restore):
+    result, dates = _result()
+    result = restore(result)
+
+    for array in (result.dates, result.closes, result.purchases, result.units, result.value,
+                  result.total_asset_purchased(), result.ending_investment_value()):
+        with pytest.raises(ValueError):
+            array[0] = array[-1]
+    with pytest.raises(AttributeError):
+        result.dates = dates
+
+    np.testing.assert_array_equal(result.total_asset_purchased(), [1.5, 8.75])
+    # the arrays passed in stay writeable
+    assert dates.flags.writeable
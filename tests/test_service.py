@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+from service import QueryService
+from utils import DataImport
+
+
+def test_service_rejects_dates_outside_the_data(data_dir):
+    service = QueryService(data_dir, ['btc', 'xau'])
+
+    status, body = asyncio.run(service._answer({'start': '2001-01-01'}))
+    assert status == 400 and 'outside the price data' in body['error']
+    status, _ = asyncio.run(service._answer({'end': '2099-01-01'}))
+    assert status == 400
+    status, body = asyncio.run(service._answer({'start': '2018-01-01', 'end': '2024-01-01'}))
+    assert status == 200 and len(body['results']) == 2
+
+
+def test_building_one_pair_does_not_block_queries_on_another(data_dir, monkeypatch):
+    service = QueryService(data_dir, ['btc', 'xau'])
+    service.query({'assets': 'btc,xau'})
+
+    building, release = threading.Event(), threading.Event()
+    join_dfs_and_pivot_weekly = DataImport.join_dfs_and_pivot_weekly
+
+    def slow_build(self, *args, asset_names=None, **kwargs):
+        if asset_names == ['xau']:
+            building.set()
+            release.wait(10)
+        return join_dfs_and_pivot_weekly(self, *args, asset_names=asset_names, **kwargs)
+
+    monkeypatch.setattr(DataImport, 'join_dfs_and_pivot_weekly', slow_build)
+    slow_query = threading.Thread(target=service.query, args=({'assets': 'xau'},))
+    slow_query.start()
+    try:
+        assert building.wait(10)
+        # answered while the xau sweep is still being built
+        assert len(service.query({'assets': 'btc,xau'})['results']) == 2
+        assert slow_query.is_alive()
+    finally:
+        release.set()
+        slow_query.join()
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from strategies import DCA, StrategyEngine, ValueAveraging
+from utils import RunSimulator
+
+
+def _weekly_prices():
+    """12 weeks of 2 assets - the second one has no price for 3 of them."""
+    closes = np.array([[100., 10.], [110., np.nan], [90., 12.], [95., np.nan], [120., 11.], [130., 9.],
+                       [125., np.nan], [140., 10.], [150., 13.], [145., 14.], [160., 12.], [170., 15.]])
+    df = pd.DataFrame(closes, columns=['a Close', 'b Close'])
+    df.insert(0, 'Date', pd.date_range('2024-01-01', periods=len(closes), freq='W-MON'))
+    return df
+
+
+def test_dca_strategy_reports_the_same_stats_as_run_simulator():
+    df = _weekly_prices()
+    results = StrategyEngine(df, ['a', 'b']).run([DCA(50)], inflation_rate=3).set_index('Asset')
+    simulator = RunSimulator(df, ['a', 'b'], 50)
+    simulator.rolling_totals()
+
+    # weeks without a price still count as invested, like in the report
+    np.testing.assert_array_equal(results.loc[['a', 'b'], 'Total Invested'], [simulator.total_usd_invested()] * 2)
+    np.testing.assert_array_equal(results.loc[['a', 'b'], 'Units'], simulator.total_asset_purchased())
+    np.testing.assert_array_equal(results.loc[['a', 'b'], 'Ending Value'], simulator.ending_investment_value())
+    np.testing.assert_array_equal(results.loc[['a', 'b'], 'Nominal ROI'], simulator.nominal_roi())
+
+
+def test_value_averaging_counts_sells_as_withdrawals():
+    results = StrategyEngine(_weekly_prices(), ['a']).run([ValueAveraging(50, allow_sells=[0, 1])], inflation_rate=0)
+    with_sells = results[results['Parameters'].str.endswith('allow_sells=1')].iloc[0]
+    without_sells = results[results['Parameters'].str.endswith('allow_sells=0')].iloc[0]
+
+    assert with_sells['Total Withdrawn'] > 0 and without_sells['Total Withdrawn'] == 0
+    assert with_sells['Nominal ROI'] == round((with_sells['Ending Value'] + with_sells['Total Withdrawn']
+                                               - with_sells['Total Invested']) / with_sells['Total Invested'] * 100, 2)
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from sweep import ParameterSweep
+from utils import DataImport
+
+
+def _sweep(data_dir):
+    run = DataImport(data_dir, ['btc', 'xau'])
+    return ParameterSweep(run.join_dfs_and_pivot_weekly('inner'), ['btc', 'xau'])
+
+
+def test_dates_outside_the_data_are_not_snapped_to_the_first_or_last_week(data_dir):
+    sweep = _sweep(data_dir)
+    first, last = pd.Timestamp(sweep.dates[0]), pd.Timestamp(sweep.dates[-1])
+
+    before, inside, after = first - pd.Timedelta(days=30), first + pd.Timedelta(days=30), last + pd.Timedelta(days=30)
+    np.testing.assert_array_equal(sweep.covers([before, inside, after]), [False, True, False])
+
+    assert sweep.run([50], start_dates=[before]).empty
+    assert sweep.run([50], end_dates=[after]).empty
+    assert len(sweep.run([50], start_dates=[before, inside], end_dates=[last])) == 2  # one cell, for both assets
+
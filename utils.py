@@ -1,94 +1,277 @@
+import hashlib
 import logging
 import os
-import math
+from io import BytesIO
 from sys import exit
-from typing import List, Literal, Tuple
+from typing import Dict, Iterator, List, Literal, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 
-from config import asset1_name, asset2_name
+from align import align, last_rows
+from cache import PriceCache, file_hash
+from config import asset1_name, asset2_name, asset_names as config_asset_names
+from cpi import CPIStore, cpi_between
+from export import EXPORT_CHUNK_ROWS, export_tables
+from fixedpoint import FixedPointResult
+from profiling import profiled
 
 logging.basicConfig(level=logging.INFO, format='Error: %(message)s')
 
 
+def _csv_candidates(main_directory: str, asset: str, csv_files: Sequence[str]) -> List[str]:
+    """Returns the paths of the .csv files named after the asset (case insensitive), in `csv_files` order."""
+    return [os.path.join(main_directory, _file) for _file in csv_files if asset.upper() in _file.upper()]
+
+
+def _has_price_columns(file_path: str, use_cache: bool = True) -> bool:
+    """
+    Returns True if the .csv has a 'Date' and 'Close' column. A fresh `PriceCache` entry answers without opening the
+    .csv (only files with both columns are cached) - otherwise just the header line is read.
+    """
+    if use_cache and PriceCache(file_path).is_fresh():
+        return True
+    return {'Date', 'Close'} <= set(pd.read_csv(file_path, nrows=0, encoding='latin1').columns)
+
+
+def _exit_missing_csv() -> None:
+    logging.error(" Check your directory to ensure there is a csv file for each asset, and that each "
+                  "contains the required columns - 'Date' and 'Close'.\n"
+                  "\t\tAlso, make sure that the asset variables in config.py correspond to the names of the "
+                  "assets you are running this report for.")
+    exit(1)
+    # NOTE: .error will terminate program but .exception will still run it, giving you NoneType: None
+    # even if an exit() follows it
+
+
+def find_price_csvs(main_directory: str, asset_names: Sequence[str], use_cache: bool = True) -> List[str]:
+    """
+    Returns the price-history .csv of each asset, in `asset_names` order - the first file of the directory named after
+    the asset (case insensitive) with a 'Date' and 'Close' column. Exits if an asset has no such file.
+
+    :param use_cache: answer from the `PriceCache` entry of the files that have a fresh one, without opening them
+    """
+    # scan the directory once - every asset is then matched against this listing
+    csv_files = sorted(_file for _file in os.listdir(main_directory) if _file.endswith('csv'))
+
+    csv_paths = []
+    for asset in asset_names:
+        file_path = next((file_path for file_path in _csv_candidates(main_directory, asset, csv_files)
+                          if _has_price_columns(file_path, use_cache)), None)
+        if file_path is None:
+            _exit_missing_csv()
+        csv_paths.append(file_path)
+    return csv_paths
+
+
+def read_price_csv(file_path: str, use_cache: bool = True) -> Optional[pd.DataFrame]:
+    """
+    Returns the 'Date' and 'Close' columns of a price-history .csv (None if it lacks either column).
+    Warm starts map the binary cache of the file instead of parsing it; the cache is rebuilt when the file changes.
+
+    :param use_cache: read & keep the `PriceCache` entry of the file
+    """
+    cache = PriceCache(file_path) if use_cache else None
+    source = file_path
+    if cache is not None:
+        cached = cache.load()
+        if cached is not None:
+            return cached
+
+        # the bytes parsed are the bytes the cache entry is keyed by (size & hash) - the mtime is taken first, so a
+        # change made while the file is read is caught by the hash check of the next run
+        with open(file_path, 'rb') as f:
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            content = f.read()
+        source = BytesIO(content)
+
+    # read each file once, keeping only the required columns (if the file has them)
+    asset_df = pd.read_csv(source, usecols=lambda col: col in ('Date', 'Close'), encoding='latin1')
+    if 'Date' not in asset_df or 'Close' not in asset_df:
+        return None
+    asset_df['Date'] = pd.to_datetime(asset_df['Date'])
+    asset_df = asset_df[['Date', 'Close']]
+
+    if cache is not None and pd.api.types.is_numeric_dtype(asset_df['Close']):
+        try:
+            cache.store(asset_df, content, mtime_ns)
+        except OSError:
+            pass  # read-only data directories simply run without the cache
+    return asset_df
+
+
 class DataImport:
-    """Used to import price-action data of two assets, and prepare them for the weekly DCA investment simulator."""
-    def __init__(self, main_directory):
+    """
+    Used to import price-action data of two or more assets, and prepare them for the weekly DCA investment simulator.
+
+    The pipeline is lazy: each stage (load, align & resample, simulate, summarize) only runs once its output is asked
+    for, and is memoized on its inputs (asset set, join method, resample rule, ...), so later calls - a second
+    simulation, `export_df` - reuse the earlier results instead of recomputing them.
+
+    :param main_directory: the directory holding one .csv file per asset
+    :param asset_names: the assets to import (ex: ['btc', 'xau']) - defaults to `asset_names` in config.py
+    :param use_cache: reuse the binary cache of each parsed .csv (see `cache.PriceCache`), rebuilding stale entries
+    :param chunk_rows: stream the .csv files in chunks of this many rows, reducing each chunk straight to weekly
+                       averages - memory is then bounded by the chunk size rather than the file size (for intraday
+                       files). None loads each file whole
+    :param ffill_days: how many days an asset's last price is carried forward onto the dates it has no price for, when
+                       the assets are aligned (ex: 3 fills the weekends & holidays of a 5-day market with its last
+                       close, to align it with a 7-day one) - 0 only aligns prices of the same date
+    """
+    def __init__(
+            self,
+            main_directory,
+            asset_names: Sequence[str] = None,
+            use_cache: bool = True,
+            chunk_rows: int = None,
+            ffill_days: int = 0
+    ):
         self.main_directory = main_directory
-        self.imported_df = self._import_price_action_csv()
-        self.df1 = self.imported_df[0]
-        self.df2 = self.imported_df[1]
-        self.df = self.join_dfs_and_pivot_weekly()
+        self.asset_names = list(asset_names) if asset_names is not None else list(config_asset_names)
+        self.use_cache = use_cache
+        self.chunk_rows = chunk_rows
+        self.ffill_days = ffill_days
+        self._memo = {}
+
+    @property
+    def imported_df(self) -> List[pd.DataFrame]:
+        """The (Date, Close) DataFrame of every asset, in `asset_names` order - loaded on first use."""
+        return self._loaded(self.asset_names)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """The weekly pivot of every asset (outer join) - built on first use."""
+        if 'df' not in self._memo:
+            self._memo['df'] = self.join_dfs_and_pivot_weekly()
+        return self._memo['df']
+
+    def _loaded(self, asset_names: Sequence[str]) -> List[pd.DataFrame]:
+        """Returns the (Date, Close) DataFrame of each asset, reading only the assets that weren't loaded yet."""
+        missing = [asset for asset in asset_names if ('load', asset) not in self._memo]
+        if missing:
+            for asset, asset_df in zip(missing, self._import_price_action_csv(missing)):
+                self._memo[('load', asset)] = asset_df
+        return [self._memo[('load', asset)] for asset in asset_names]
+
+    @profiled('load', rows=lambda result, *_: sum(map(len, result)))
+    def _import_price_action_csv(self, asset_names: Sequence[str] = None) -> List[pd.DataFrame]:
+        """
+        Creates a list of DataFrames from .csv files, one .csv per asset, all located inside the project root directory.
+        An asset's file is the first one named after it (case insensitive) with a 'Date' and 'Close' column - the
+        columns are checked on that one read of each candidate, which also memoizes the file's path.
+        Always reads the files - use `imported_df` for the memoized DataFrames.
+        """
+        if asset_names is None:
+            asset_names = self.asset_names
+
+        csv_files = None
+        asset_dfs = []
+        for asset in asset_names:
+            if ('path', asset) in self._memo:
+                candidates = [self._memo[('path', asset)]]
+            else:
+                # scan the directory once - every asset is then matched against this listing
+                if csv_files is None:
+                    csv_files = sorted(_file for _file in os.listdir(self.main_directory) if _file.endswith('csv'))
+                candidates = _csv_candidates(self.main_directory, asset, csv_files)
+
+            for file_path in candidates:
+                asset_df = read_price_csv(file_path, self.use_cache)
+                if asset_df is not None:
+                    self._memo[('path', asset)] = file_path
+                    asset_dfs.append(asset_df)
+                    break
+            else:
+                _exit_missing_csv()
+        return asset_dfs
 
-    def _import_price_action_csv(self) -> List[pd.DataFrame]:
+    def _csv_paths(self, asset_names: Sequence[str]) -> List[str]:
         """
-        Creates a list of DataFrames from .csv files, assuming each has a 'Date' and 'Close' column.
-        One .csv per asset, and both must be located inside the project root directory.
+        Returns the .csv file of each asset, in `asset_names` order (see `find_price_csvs`). Memoized: only the assets
+        not matched yet are looked up - by loading them (which checks their columns), unless streaming.
         """
-        df = []
+        missing = [asset for asset in asset_names if ('path', asset) not in self._memo]
+        if missing and self.chunk_rows:
+            for asset, file_path in zip(missing, find_price_csvs(self.main_directory, missing, self.use_cache)):
+                self._memo[('path', asset)] = file_path
+        elif missing:
+            self._loaded(missing)
+
         # order matters: need to assign assets to df in order, so the indexing is maintained for the rest of the script
-        for asset in [asset1_name, asset2_name]:
-            for _file in os.listdir(self.main_directory):
-                file_path = os.path.join(self.main_directory, _file)
-                # if file_path.endswith('.csv'):
-                if _file.upper().__contains__(asset.upper()) and _file.endswith('csv'):
-                    test_import = pd.read_csv(file_path, nrows=1, encoding='latin1').columns
-                    if 'Date' in test_import and 'Close' in test_import:
-                        df.append(pd.read_csv(
-                            file_path,
-                            usecols=['Date', 'Close'],
-                            parse_dates=['Date'],
-                            encoding='latin1')
-                        )
-
-        # Making sure both df's are read. Any other errors will be passed to parent method - will exception-catch there.
-        if len(df) < 2:
-            logging.error(" Check your directory to ensure there are 2 csv files - one for each asset - and that each "
-                          "contains the required columns - 'Date' and 'Close'.\n"
-                          "\t\tAlso, make sure that the asset variables in config.py correspond to the names of the "
-                          "assets you are running this report for.")
-            exit(1)
-            # NOTE: .error will terminate program but .exception will still run it, giving you NoneType: None
-            # even if an exit() follows it
-        return df
+        return [self._memo[('path', asset)] for asset in asset_names]
+
+    def _read_chunks(self, file_path: str) -> Iterator[pd.Series]:
+        """
+        Yields the closing prices of a price-history .csv, `chunk_rows` rows at a time, as Series indexed by date.
+        Every chunk is parsed with the date format inferred from the first one, like a whole-file read would.
+        """
+        date_format = None
+        last_date = None
+        for chunk in pd.read_csv(file_path, usecols=lambda col: col in ('Date', 'Close'), encoding='latin1',
+                                 chunksize=self.chunk_rows):
+            if date_format is None:
+                date_format = guess_datetime_format(str(chunk['Date'].iloc[0]))
+            closes = chunk.set_index(pd.to_datetime(chunk['Date'], format=date_format))['Close'].sort_index()
+            closes.index.name = 'Date'
+
+            if last_date is not None and closes.index[0] <= last_date:
+                logging.error(f"{file_path} isn't sorted by date - chunked ingest (chunk_rows) needs the rows of "
+                              f"every file in chronological order.")
+                exit(1)
+            last_date = closes.index[-1]
+            yield closes
 
-    def determine_date_range(self) -> List:
+    def price_hash(self, asset_names: Sequence[str] = None) -> str:
+        """
+        Returns the content hash of the price .csv of every asset (or just `asset_names`) - the key of the results
+        computed from them (see `cache.ResultCache`). The hash kept by a fresh `PriceCache` entry is reused, so
+        unchanged files aren't read again.
+        """
+        digest = hashlib.sha256()
+        for file_path in self._csv_paths(asset_names if asset_names is not None else self.asset_names):
+            cache = PriceCache(file_path) if self.use_cache else None
+            digest.update((cache.content_hash() if cache is not None and cache.is_fresh() else file_hash(file_path))
+                          .encode())
+        return digest.hexdigest()
+
+    def _date_span(self, asset: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """Returns the first and last date of an asset's price history - streamed in chunks when `chunk_rows` is set."""
+        key = ('span', asset)
+        if key not in self._memo:
+            if self.chunk_rows:
+                first_date = last_date = None
+                for closes in self._read_chunks(self._csv_paths([asset])[0]):
+                    first_date = closes.index[0] if first_date is None else first_date
+                    last_date = closes.index[-1]
+                self._memo[key] = first_date, last_date
+            else:
+                dates = self._loaded([asset])[0]['Date']
+                self._memo[key] = dates.min(), dates.max()
+        return self._memo[key]
+
+    @profiled('date range')
+    def determine_date_range(self, asset_names: Sequence[str] = None) -> List:
         """
         Returns a 3-item list containing the start/end dates of the price-history data, as well as total years elapsed.
-        Exactly 2 csv files are required. Both assets must start/end on the same date, the date range(s) must be >=1Y.
+        When the assets (or just `asset_names`) start or end on different dates, the report covers the range they all
+        share - which must be >=1Y.
         """
+        if asset_names is None:
+            asset_names = self.asset_names
         try:
-            if (
-                self.imported_df[0]['Date'].dt.date.min() == self.imported_df[1]['Date'].dt.date.min() and
-                self.imported_df[0]['Date'].dt.date.max() == self.imported_df[1]['Date'].dt.date.max()
-            ):
-                start_date = self.imported_df[0]['Date'].dt.date.min()
-                end_date = self.imported_df[0]['Date'].dt.date.max()
-                report_date_range_in_years = round((end_date - start_date).days / 365, 2)
-                n_dfs_imported = len(self.imported_df)
-
-                if report_date_range_in_years < 1:
-                    logging.error("To run this report, ensure that your dataset has at least 1 year of price history. "
-                                  f"You've provided just {(end_date - start_date).days} days worth.\n\n")
-                    exit(1)
-
-                elif n_dfs_imported > 2:
-                    logging.error(f"Detected {n_dfs_imported} assets in your DataImport. Only 2 are allowed. "
-                                  f"Delete any extra .csv files in your root directory and try again.")
-                    exit(1)
-
-                return [start_date, end_date, report_date_range_in_years]
-
+            # find (and load, unless streaming) every asset in one go - `_date_span` then reads them from the memo
+            if self.chunk_rows:
+                self._csv_paths(asset_names)
             else:
-                logging.error("The date-ranges of the two data sets do not match. "
-                              "For this report to run, both datasets must start & end on the same dates.")
-                exit(1)
+                self._loaded(asset_names)
+            return self.shared_date_range([self._date_span(asset) for asset in asset_names])
+
         except AttributeError:
             logging.exception("There appears to be 1 or more improperly formatted dates in your dataset.\n\n")
             exit(1)
-        except IndexError:
-            logging.exception("Check to make sure there are exactly 2 .csv files with price data in your directory, "
+        except (IndexError, KeyError):
+            logging.exception("Check to make sure there is one .csv file with price data per asset in your directory, "
                               "and that each file contains at least a 'Date' and 'Close' column (case sensitive).\n\n")
             exit(1)
         except TypeError:
@@ -96,90 +279,503 @@ class DataImport:
                               "whitespace in an empty column. Clean your data and try again.\n\n")
             exit(1)
 
+    @staticmethod
+    def shared_date_range(spans: Sequence[Tuple[pd.Timestamp, pd.Timestamp]]) -> List:
+        """
+        Returns the [start date, end date, years] of the range every asset covers - the (first date, last date) spans
+        must overlap by >=1Y. Warns when the spans differ.
+        """
+        start_dates = {first_date.date() for first_date, _ in spans}
+        end_dates = {last_date.date() for _, last_date in spans}
+        start_date = max(start_dates)
+        end_date = min(end_dates)
+
+        if start_date > end_date:
+            logging.error("The date-ranges of the data sets do not overlap. "
+                          "For this report to run, all datasets must share at least 1 year of price history.")
+            exit(1)
+        if len(start_dates) > 1 or len(end_dates) > 1:
+            print(f"Warning: The date-ranges of the data sets differ - the report covers the range they all share, "
+                  f"{start_date} through {end_date}.")
+
+        report_date_range_in_years = round((end_date - start_date).days / 365, 2)
+        if report_date_range_in_years < 1:
+            logging.error("To run this report, ensure that your dataset has at least 1 year of price history. "
+                          f"You've provided just {(end_date - start_date).days} days worth.\n\n")
+            exit(1)
+
+        return [start_date, end_date, report_date_range_in_years]
+
+    def weekly_price_matrix(
+            self,
+            join_method: Literal['left', 'right', 'inner', 'outer'] = None,
+            rule: str = 'W-MON',
+            asset_names: Sequence[str] = None,
+            round_to: Optional[int] = 2
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Aligns every asset on its 'Date' column, then calculates the mean weekly closing price of each asset.
+        Memoized on (join method, resample rule, asset set, rounding) - the returned arrays are read-only. The rounded
+        matrix is rounded from the memoized unrounded one, so the assets are only aligned once.
+
+        :param: join_method: the join method (left, right, inner, outer)
+        :param: rule: the pandas resample rule (weeks ending on Monday by default)
+        :param: asset_names: the assets to include - defaults to all of them
+        :param: round_to: the decimals the mean prices are rounded to (cents by default) - None leaves them unrounded
+        :return: (dates, prices) - the week labels, and a (n_weeks x n_assets) float array of mean closing prices whose
+                 columns follow the order of `asset_names`.
+        """
+        if join_method is None:
+            join_method = 'outer'
+        asset_names = tuple(asset_names if asset_names is not None else self.asset_names)
+
+        key = ('matrix', join_method, rule, asset_names, round_to)
+        if key not in self._memo:
+            if round_to is None:
+                dates, prices = self._weekly_price_matrix(join_method, rule, asset_names)
+            else:
+                dates, prices = self.weekly_price_matrix(join_method, rule, asset_names, None)
+                prices = np.round(prices, round_to)
+            dates.setflags(write=False)
+            prices.setflags(write=False)
+            self._memo[key] = dates, prices
+        return self._memo[key]
+
+    def _rows_read(self, asset_names: Tuple[str]) -> int:
+        """Returns the number of price rows the weekly matrix of these assets was built from (for the profiler)."""
+        if self.chunk_rows:
+            return self._memo.get(('rows', asset_names), 0)
+        return sum(map(len, self._loaded(asset_names)))
+
+    @profiled('align & resample', rows=lambda result, self, join_method, rule, asset_names:
+              self._rows_read(asset_names))
+    def _weekly_price_matrix(
+            self,
+            join_method: str,
+            rule: str,
+            asset_names: Tuple[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if self.chunk_rows:
+            return self._stream_weekly_price_matrix(join_method, rule, asset_names)
+
+        closes = [
+            asset_df.set_index('Date')['Close'].rename(asset)
+            for asset, asset_df in zip(asset_names, self._loaded(asset_names))
+        ]
+        weekly = self.resample_weekly(self.align_closes(closes, join_method, self.ffill_days), rule, round_to=None)
+
+        return weekly.index.to_numpy(), weekly.to_numpy(dtype=float)
+
+    def _stream_weekly_price_matrix(
+            self,
+            join_method: str,
+            rule: str,
+            asset_names: Tuple[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Same result as `_weekly_price_matrix`, but the files are read `chunk_rows` rows at a time. Chunk rows are only
+        aligned up to the latest date every file has reached (so no row misses its match in another file), and the rows
+        of the still open week are carried over to the next chunk - every week is averaged in one piece, exactly like
+        the full pivot (and every file's last aligned price is carried over, to forward-fill from). Memory is bounded
+        by one chunk per asset, plus one week of rows.
+        """
+        readers = [self._read_chunks(file_path) for file_path in self._csv_paths(asset_names)]
+        pending = [pd.Series(dtype=float, index=pd.DatetimeIndex([], name='Date'), name=asset) for asset in asset_names]
+        exhausted = [False] * len(readers)
+        # every asset's last aligned row, to forward-fill from across chunks
+        last_seen = [None] * len(readers)
+        open_rows = None
+        weeks = []
+        n_rows = 0
+
+        while True:
+            # refill the files whose rows were all aligned
+            for i, reader in enumerate(readers):
+                if not exhausted[i] and pending[i].empty:
+                    closes = next(reader, None)
+                    if closes is None:
+                        exhausted[i] = True
+                    else:
+                        pending[i] = closes.rename(asset_names[i])
+                        n_rows += len(closes)
+
+            # rows up to the watermark are final in every file - everything is once all the files are read
+            last_dates = [closes.index[-1] for closes, done in zip(pending, exhausted) if not done]
+            watermark = min(last_dates) if last_dates else None
+            released = []
+            for i, closes in enumerate(pending):
+                n_released = len(closes) if watermark is None else \
+                    int(np.searchsorted(closes.index.to_numpy(), watermark.to_datetime64(), side='right'))
+                released.append(closes.iloc[:n_released])
+                pending[i] = closes.iloc[n_released:]
+
+            # a forward-filled inner join ends on the last date of the files read to their end
+            end = min((last_seen[i][0] for i, done in enumerate(exhausted) if done and last_seen[i] is not None),
+                      default=None)
+            aligned = self.align_closes(released, join_method, self.ffill_days, last_seen, end)
+            last_seen = last_rows([closes.index.to_numpy() for closes in released],
+                                  [closes.to_numpy(dtype=float) for closes in released], last_seen)
+            rows = pd.concat([open_rows, aligned]) if open_rows is not None and len(open_rows) else aligned
+            if len(rows):
+                weekly = self.resample_weekly(rows, rule, round_to=None)
+                if watermark is None:
+                    weeks.append(weekly)
+                    break
+                # the last week may still get rows from the next chunks - keep its rows rather than its average
+                weeks.append(weekly.iloc[:-1])
+                open_rows = rows.iloc[len(rows) - rows.resample(rule).size().iloc[-1]:]
+            elif watermark is None:
+                break
+
+        self._memo[('rows', asset_names)] = n_rows
+        # weeks without a single aligned row between two chunks still get their (empty) row, like in the full pivot
+        weekly = pd.concat(weeks).resample(rule).mean() if weeks else \
+            pd.DataFrame(columns=list(asset_names), dtype=float, index=pd.DatetimeIndex([], name='Date'))
+        return weekly.index.to_numpy(), weekly.to_numpy(dtype=float)
+
+    @staticmethod
+    def align_closes(
+            closes: List[pd.Series],
+            join_method: str,
+            ffill_days: int = 0,
+            last_seen: List[Optional[Tuple[np.datetime64, float]]] = None,
+            end: Optional[np.datetime64] = None
+    ) -> pd.DataFrame:
+        """
+        Aligns the closing-price Series of every asset (indexed by date) into one DataFrame, one column per asset - an
+        as-of join on sorted date arrays (see `align.align`), forward-filling prices for up to `ffill_days` (an inner
+        join then keeps the dates every asset has a price on, up to `end`). Series that aren't in chronological order
+        are sorted first.
+        """
+        # Some assets trade on weekends, while others don't. Hence, outer join is preferred.
+        closes = [series if series.index.is_monotonic_increasing else series.sort_index(kind='stable')
+                  for series in closes]
+        calendar, prices = align(
+            [series.index.to_numpy() for series in closes],
+            [series.to_numpy(dtype=float) for series in closes],
+            join_method, ffill_days, last_seen, end
+        )
+        return pd.DataFrame(prices, index=pd.DatetimeIndex(calendar, name='Date'),
+                            columns=[series.name for series in closes])
+
+    @staticmethod
+    def resample_weekly(aligned: pd.DataFrame, rule: str = 'W-MON', round_to: Optional[int] = 2) -> pd.DataFrame:
+        """
+        Returns the mean weekly closing price of every asset (weeks are labelled by Monday), rounded to the cent - or
+        to `round_to` decimals (None leaves the means unrounded, ex: for exact accounting at finer price decimals).
+        """
+        weekly = aligned.resample(rule).mean()
+        return weekly if round_to is None else weekly.round(round_to)
+
     def join_dfs_and_pivot_weekly(
             self,
-            join_method: Literal['left', 'right', 'inner', 'outer', 'cross'] = None
+            join_method: Literal['left', 'right', 'inner', 'outer'] = None,
+            rule: str = 'W-MON',
+            asset_names: Sequence[str] = None,
+            round_to: Optional[int] = 2
     ) -> pd.DataFrame:
 
         """
-        Merges the 2 price-history df's, then calculates the mean weekly closing price for each asset.
+        Merges the price-history df's, then calculates the mean weekly closing price for each asset.
+        The merge & resample is memoized (see `weekly_price_matrix`), each call returns a new DataFrame.
 
-        :param: join_method: the join method (left, right, inner, outer, cross)
-        :return: (pd.DataFrame) 3 columns; Year-Week, Asset1 mean closing price, and Asset2 mean closing price.
+        :param: join_method: the join method (left, right, inner, outer)
+        :param: round_to: the decimals the mean prices are rounded to (cents by default) - None leaves them unrounded
+        :return: (pd.DataFrame) the Year-Week column, followed by one mean closing price column per asset.
         """
+        asset_names = list(asset_names if asset_names is not None else self.asset_names)
+        dates, prices = self.weekly_price_matrix(join_method, rule, asset_names, round_to)
 
-        # since this method is eager loaded, you need the param to have a default this way:
-        if join_method is None:
-            join_method = 'outer'
+        # build the frame straight from the price matrix, so all price columns share a single NumPy block
+        piv = pd.DataFrame(prices, columns=[f'{asset} Close' for asset in asset_names])
+        piv.insert(0, 'Date', dates)
 
-        # Join the two df's on the date column.
-        merged_df = \
-            pd.merge(
-                self.df1,
-                self.df2,
-                on='Date',
-                how=join_method  # some assets trade on weekends, while others don't. Hence, outer join is preferred.
-            ).rename({'Close_x': f'{asset1_name} Close', 'Close_y': f'{asset2_name} Close'}, axis=1) \
-            .reset_index() \
-            [['Date', f'{asset1_name} Close', f'{asset2_name} Close']]
+        return piv
 
-        # Create pivot table by year/week, with average weekly closing price.
-        piv = merged_df.resample('W-MON', on='Date').mean().reset_index()
+    @staticmethod
+    def _exact_key(unit_decimals: Dict[str, int] = None, price_decimals: Dict[str, int] = None) -> Optional[tuple]:
+        """Returns the hashable exact-accounting decimals of a memo key - None when not in exact accounting."""
+        if unit_decimals is None:
+            return None
+        return tuple(sorted(unit_decimals.items())), tuple(sorted((price_decimals or {}).items()))
 
-        # round the newly created value columns
-        piv.iloc[:, -2:] = piv.iloc[:, -2:].round(2)
+    def simulate(
+            self,
+            weekly_investment: float,
+            join_method: Literal['left', 'right', 'inner', 'outer'] = 'inner',
+            rule: str = 'W-MON',
+            asset_names: Sequence[str] = None,
+            unit_decimals: Dict[str, int] = None,
+            price_decimals: Dict[str, int] = None,
+            result: Union['SimulationResult', FixedPointResult] = None
+    ) -> 'RunSimulator':
+        """
+        Returns the `RunSimulator` of every asset, with its rolling totals already computed on its own weekly pivot.
+        Memoized on (weekly investment, join method, resample rule, asset set, exact accounting decimals). Exact
+        accounting gets the unrounded weekly means, which it counts in each asset's own price decimals.
 
-        return piv
+        :param result: the result of this simulation, already computed (ex: read back from the result cache) - it is
+                       memoized as is, without loading or simulating anything, so later stages (`export_df`) see it
+        """
+        asset_names = tuple(asset_names if asset_names is not None else self.asset_names)
+        exact = self._exact_key(unit_decimals, price_decimals)
+        key = ('simulate', weekly_investment, join_method, rule, asset_names, exact)
+        if key not in self._memo and result is not None:
+            self._memo[key] = RunSimulator(result.to_frame(), list(asset_names), weekly_investment, result=result,
+                                           unit_decimals=unit_decimals, price_decimals=price_decimals)
+        elif key not in self._memo:
+            simulator = RunSimulator(
+                self.join_dfs_and_pivot_weekly(join_method, rule, asset_names, round_to=2 if exact is None else None),
+                list(asset_names), weekly_investment, unit_decimals=unit_decimals, price_decimals=price_decimals
+            )
+            simulator.rolling_totals()
+            self._memo[key] = simulator
+        return self._memo[key]
 
-    def export_df(self, output_directory) -> None:
+    def summarize(
+            self,
+            weekly_investment: float,
+            join_method: Literal['left', 'right', 'inner', 'outer'] = 'inner',
+            rule: str = 'W-MON',
+            asset_names: Sequence[str] = None,
+            unit_decimals: Dict[str, int] = None,
+            price_decimals: Dict[str, int] = None
+    ) -> dict:
         """
-        Returns .xlsx file with 3 sheets: the merged df from pivot() method, and the original data of the two assets."""
-        import os
+        Returns the summary stats of `simulate` (per-asset Series, keyed by stat name).
+        Memoized on the same inputs as `simulate`, plus the CPI used for the real ROI.
+        """
+        asset_names = tuple(asset_names if asset_names is not None else self.asset_names)
+        exact = self._exact_key(unit_decimals, price_decimals)
+        key = ('summarize', weekly_investment, join_method, rule, asset_names, exact,
+               RunSimulator.cpi_starting, RunSimulator.cpi_ending)
+        if key not in self._memo:
+            simulator = self.simulate(weekly_investment, join_method, rule, asset_names, unit_decimals, price_decimals)
+            self._memo[key] = {
+                'total_usd_invested': simulator.total_usd_invested(),
+                'ending_usd': simulator.ending_investment_value(),
+                'ending_units': simulator.total_asset_purchased(),
+                'nominal_roi': simulator.nominal_roi(),
+                'real_roi': simulator.real_roi(),
+                'usd_return_inflation_adjusted': simulator.usd_return_inflation_adjusted()
+            }
+        return self._memo[key]
+
+    def export_df(self, output_path: str, fmt: str = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> List[str]:
+        """
+        Exports the weekly pivot of every asset, the results of every simulation run so far (see `simulate`) and the
+        original data of each asset - chunk by chunk, see `export.export_tables`. With `chunk_rows` set on the import,
+        the original data is streamed straight from the .csv files instead of being loaded.
+
+        :param output_path: an .xlsx file (one sheet per table), or the directory the table files are written to
+        :param fmt: 'csv', 'parquet', 'arrow' or 'xlsx' - defaults to 'xlsx' for an .xlsx path, else 'csv'
+        :param chunk_rows: the rows converted & written at a time
+        :return: the paths of the files written
+        """
+        tables = {f'by_week_{"_".join(self.asset_names)}': self.df}
+        for key, simulator in list(self._memo.items()):
+            if key[0] == 'simulate':
+                _, investment, join_method, rule, asset_names, exact = key
+                name = f'simulation_{"_".join(asset_names)}_{investment:g}_{join_method}_{rule}'
+                tables[name + ('_exact' if exact is not None else '')] = simulator.result.to_frame()
+
+        for asset, file_path in zip(self.asset_names, self._csv_paths(self.asset_names)):
+            if self.chunk_rows is not None:
+                tables[f'raw_{asset}'] = (closes.reset_index() for closes in self._read_chunks(file_path))
+            else:
+                tables[f'raw_{asset}'] = self._loaded([asset])[0]
 
-        with pd.ExcelWriter(os.path.join(output_directory)) as writer:
-            self.df.to_excel(writer, sheet_name=f'by week - {asset1_name} x {asset2_name}', index=False)
-            self.df1.to_excel(writer, sheet_name=f'raw data - {asset1_name}', index=False)
-            self.df2.to_excel(writer, sheet_name=f'raw data - {asset2_name}', index=False)
+        return export_tables(tables, output_path, fmt, chunk_rows)
+
+
+class SimulationResult:
+    """
+    Immutable, array-backed result of a DCA simulation - the purchases, running units and portfolio value of every
+    asset, as contiguous (n_weeks x n_assets) arrays. The scalar summaries are worked out once, in float64, when the
+    result is created, so they stay exact even when the arrays are stored as float32 to save memory.
+
+    :param asset_names: the simulated assets, in column order
+    :param dates: the week labels
+    :param closes: (n_weeks x n_assets) mean weekly closing prices
+    :param purchases: (n_weeks x n_assets) amount of asset purchased each week (NaN for weeks without a price)
+    :param units: (n_weeks x n_assets) asset accumulated by each week
+    :param value: (n_weeks x n_assets) portfolio value in USD by each week
+    :param weekly_investment: the static dollar amount invested weekly
+    :param dtype: the dtype the arrays are stored as (np.float64, or np.float32 for a compact result)
+    """
+
+    __slots__ = ('asset_names', 'dates', 'closes', 'purchases', 'units', 'value', 'weekly_investment', '_summary')
+
+    def __init__(
+            self,
+            asset_names: Sequence[str],
+            dates: np.ndarray,
+            closes: np.ndarray,
+            purchases: np.ndarray,
+            units: np.ndarray,
+            value: np.ndarray,
+            weekly_investment: float,
+            dtype: type = np.float64
+    ) -> None:
+        def frozen(array: np.ndarray, dtype: type = None) -> np.ndarray:
+            # a read-only view - the array passed in is left as it was
+            array = np.ascontiguousarray(array, dtype=dtype).view()
+            array.setflags(write=False)
+            return array
+
+        summary = {
+            'total_usd_invested': np.round(len(dates) * weekly_investment, 2),
+            'total_asset_purchased': frozen(np.nansum(purchases, axis=0).round(2)),
+            'ending_investment_value': frozen(np.asarray(value[-1], dtype=float).round(2)),
+        }
+
+        for name, attribute in [
+            ('asset_names', tuple(asset_names)),
+            ('dates', frozen(dates)),
+            ('closes', frozen(closes, dtype)),
+            ('purchases', frozen(purchases, dtype)),
+            ('units', frozen(units, dtype)),
+            ('value', frozen(value, dtype)),
+            ('weekly_investment', weekly_investment),
+            ('_summary', summary)
+        ]:
+            object.__setattr__(self, name, attribute)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SimulationResult is immutable")
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state: dict) -> None:
+        # unpickled (ex: from the result cache) - the arrays come back writeable, so they are frozen again
+        for name, attribute in state.items():
+            for array in attribute.values() if isinstance(attribute, dict) else [attribute]:
+                if isinstance(array, np.ndarray):
+                    array.setflags(write=False)
+            object.__setattr__(self, name, attribute)
+
+    def total_asset_purchased(self) -> np.ndarray:
+        """Returns the total quantity of each asset purchased over the entire date range."""
+        return self._summary['total_asset_purchased']
+
+    def total_usd_invested(self) -> float:
+        """Returns the total USD invested over the date range."""
+        return self._summary['total_usd_invested']
+
+    def ending_investment_value(self) -> np.ndarray:
+        """Returns the ending portfolio value in USD of each asset, on the last week of the date range."""
+        return self._summary['ending_investment_value']
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the result as the weekly pivot plus 3 columns per asset (Weekly Purchase, Rolling Sum, Portfolio
+        Value Rolling Sum) - for charting and exports."""
+        frame = pd.DataFrame(self.closes, columns=[f'{asset} Close' for asset in self.asset_names])
+        frame.insert(0, 'Date', self.dates)
+        for i, asset in enumerate(self.asset_names):
+            frame[f'{asset} Weekly Purchase'] = self.purchases[:, i]
+            frame[f'{asset} Rolling Sum'] = self.units[:, i]
+            frame[f'{asset} Portfolio Value Rolling Sum'] = self.value[:, i]
+        return frame
 
 
 class RunSimulator:
     """
     Runs a DCA simulation based on an assets weekly average price history, and a fixed reoccurring investment amount.
+    Pass a list of asset names to simulate every asset of the price matrix in a single vectorized pass - the summary
+    methods then return a Series keyed by asset name, instead of a single value.
+    The df is never modified: the simulation is kept in `result`, an immutable `SimulationResult`.
 
     :param df: The DataFrame you created in the `join_dfs_and_pivot_weekly` method of the `DataImport` class
-    :param asset_name: the name of the asset (ex: 'BTC' or 'XAU')
+    :param asset_name: the name of the asset (ex: 'BTC' or 'XAU'), or a list of asset names
     :param weekly_investment: the static dollar amount to invest weekly
+    :param dtype: the dtype of the result arrays - np.float32 halves their memory (the summaries stay float64)
+    :param result: an already computed result for this df (ex: from `IncrementalState.to_result`)
+    :param unit_decimals: run in exact accounting instead (see `fixedpoint.FixedPointResult`), counting each asset's
+                          units in these decimals (ex: {'btc': 8}) - an empty dict uses the default for every asset
+    :param price_decimals: in exact accounting, the decimals each asset's prices are counted in (ex: {'shib': 8}) -
+                           cents for every asset not listed
     """
 
-    # these attributes are returned from `cpi_scrape()`, which are then passed to `inflation_rate()`
+    # these attributes are returned from `cpi_lookup()`, which are then passed to `inflation_rate()` - pass
+    # cpi_starting/cpi_ending to the constructor to give a single simulation its own CPI instead
     cpi_starting = None
     cpi_ending = None
     inflation_is_zero = False
 
-    def __init__(self, df: pd.DataFrame, asset_name: str, weekly_investment: int) -> None:
+    def __init__(
+            self,
+            df: pd.DataFrame,
+            asset_name: Union[str, Sequence[str]],
+            weekly_investment: int,
+            cpi_starting: float = None,
+            cpi_ending: float = None,
+            dtype: type = np.float64,
+            result: Union[SimulationResult, FixedPointResult] = None,
+            unit_decimals: Dict[str, int] = None,
+            price_decimals: Dict[str, int] = None
+    ) -> None:
         self.df = df
         self.asset_name = asset_name
+        self.asset_names = [asset_name] if isinstance(asset_name, str) else list(asset_name)
         self.weekly_investment = weekly_investment
-
-    def rolling_totals(self) -> None:
-        """Creates 3 new columns for the df -
+        self.dtype = dtype
+        self.result = result
+        self.unit_decimals = unit_decimals
+        self.price_decimals = price_decimals
+        if cpi_starting is not None:
+            self.cpi_starting = cpi_starting
+        if cpi_ending is not None:
+            self.cpi_ending = cpi_ending
+
+    def _columns(self, suffix: str) -> List[str]:
+        """Returns the df column names holding `suffix` for every simulated asset (ex: 'btc Close')."""
+        return [f'{asset} {suffix}' for asset in self.asset_names]
+
+    def _per_asset(self, values: np.ndarray):
+        """Returns a single value when simulating one asset, otherwise a Series of values keyed by asset name."""
+        if isinstance(self.asset_name, str):
+            return values[0]
+        return pd.Series(values, index=self.asset_names)
+
+    def _result(self) -> Union[SimulationResult, FixedPointResult]:
+        """Returns the simulation result, running the simulation first if needed."""
+        if self.result is None:
+            self.rolling_totals()
+        return self.result
+
+    @profiled('simulate', rows=lambda result, self: len(self.df) * len(self.asset_names))
+    def rolling_totals(self) -> Union[SimulationResult, FixedPointResult]:
+        """Runs the simulation, and returns (and keeps) its result - 3 arrays per asset:
             1. Purchase Amount: how much of the asset was purchased each week with the fixed weekly investment
             2. Rolling Sum: how much asset you have accumulated in your portfolio by that given week
             3. Portfolio Value: your portfolio value over time, using the most recent weekly average price
         """
         try:
-            # 1. Create column of amount purchased each given week (fixed investment amount / asset price that week)
-            self.df[f'{self.asset_name} Weekly Purchase'] = \
-                (self.weekly_investment/self.df[f'{self.asset_name} Close']).round(2)
+            closes = self.df[self._columns('Close')].to_numpy(dtype=float)
+
+            if self.unit_decimals is not None:
+                # exact accounting, on scaled int64 arrays
+                self.result = FixedPointResult(
+                    self.asset_names, self.df['Date'].to_numpy(), closes, self.weekly_investment, self.unit_decimals,
+                    self.price_decimals
+                )
+                return self.result
+
+            # 1. Amount purchased each given week (fixed investment amount / asset price that week)
+            purchases = np.round(self.weekly_investment / closes, 2)
 
-            # 2. Create column of asset accumulated over time (rolling sum of weekly purchase column)
-            n_weeks = len(self.df[f'{self.asset_name} Weekly Purchase'])
-            self.df[f'{self.asset_name} Rolling Sum'] = \
-                self.df[f'{self.asset_name} Weekly Purchase'].rolling(n_weeks, min_periods=0).sum()
+            # 2. Asset accumulated over time (running total of weekly purchases - weeks without a price add nothing)
+            rolling_sum = np.cumsum(np.nan_to_num(purchases), axis=0)
 
             # 3. Same as step 2, but denominated in USD (weekly closing price * asset accumulated by that given week)
-            self.df[f'{self.asset_name} Portfolio Value Rolling Sum'] = \
-                (self.df[f'{self.asset_name} Rolling Sum'] * self.df[f'{self.asset_name} Close']).round(2)
+            portfolio_value = np.round(rolling_sum * closes, 2)
+
+            self.result = SimulationResult(
+                self.asset_names, self.df['Date'].to_numpy(), closes, purchases, rolling_sum, portfolio_value,
+                self.weekly_investment, self.dtype
+            )
+            return self.result
 
         except (TypeError, KeyError):
             logging.exception("Please check your weekly_investment and df parameters in the rolling_totals method.")
@@ -187,122 +783,183 @@ class RunSimulator:
 
     def total_asset_purchased(self) -> float:
         """Returns the total quantity of asset you have purchased over the entire date range."""
-        return self.df[f'{self.asset_name} Weekly Purchase'].sum().round(2)
+        return self._per_asset(self._result().total_asset_purchased())
 
     def total_usd_invested(self) -> float:
         """Returns the total USD invested over the date range."""
-        return (self.df['Date'].count() * self.weekly_investment).round(2)
+        return self._result().total_usd_invested()
 
     def ending_investment_value(self) -> float:
         """Returns the ending portfolio value in USD that you have on the last week of the date range."""
-        return (
-            self.df.query("Date == Date.max()")[f'{self.asset_name} Portfolio Value Rolling Sum'].values[0]
-        ).round(2)
+        return self._per_asset(self._result().ending_investment_value())
 
     def nominal_roi(self) -> float:
         """Returns the nominal rate of return of the date range for the asset in your df."""
         total_invested = self.total_usd_invested()
         current_investment_value = self.ending_investment_value()
-        return round(((current_investment_value - total_invested) / total_invested)*100, 2)
+        return np.round(((current_investment_value - total_invested) / total_invested)*100, 2)
 
     def real_roi(self) -> float:
         """Returns the real rate of return by factoring in inflation using the Fisher equation."""
         inflation_rate_as_decimal = self.inflation_rate()/100
         nominal_roi_as_decimal = self.nominal_roi()/100
         fisher_equation = ((1+nominal_roi_as_decimal) / (1+inflation_rate_as_decimal)) - 1
-        return round(fisher_equation*100, 2)
+        return np.round(fisher_equation*100, 2)
 
     def usd_return_inflation_adjusted(self) -> float:
         """Returns the USD returned on your investment, priced in starting dollars (inflation adjusted)."""
         real_roi_as_decimal = self.real_roi()/100
-        return round(self.total_usd_invested() * (1+real_roi_as_decimal), 2)
+        return np.round(self.total_usd_invested() * (1+real_roi_as_decimal), 2)
 
     @staticmethod
-    def cpi_scrape(start, end) -> Tuple[float, float]:
+    @profiled('cpi')
+    def cpi_lookup(start, end) -> Tuple[float, float]:
         """
-        Returns the starting and ending CPI from government stats, and based on date range from DataImport.
-        :return [cpi_starting, cpi_ending] - also saves these vars as class attributes
+        Returns the starting and ending CPI of the date range from DataImport, read from the local CPI store (cpi.py).
+        :return [cpi_starting, cpi_ending] - also saves these vars as class attributes, the default for every simulation
         """
-        try:
-            start = pd.to_datetime(start)
-            end = pd.to_datetime(end)
-            url = "https://www.usinflationcalculator.com/inflation/" \
-                  "consumer-price-index-and-annual-percent-changes-from-1913-to-2008/"
-
-            # import/wrangle CPI table
-            df = pd.read_html(url)[0]
-            df.columns = df.iloc[1]
-            df = df.iloc[2:, :-4]
-            df = df.melt(id_vars='Year')\
-                .rename({1: 'Month'}, axis=1)
-
-            # map dates, so pandas can work with them
-            df['Month'] = df['Month'].map(
-                {
-                    'Jan': 1,
-                    'Feb': 2,
-                    'Mar': 3,
-                    'Apr': 4,
-                    'May': 5,
-                    'June': 6,
-                    'July': 7,
-                    'Aug': 8,
-                    'Sep': 9,
-                    'Oct': 10,
-                    'Nov': 11,
-                    'Dec': 12
-                }
-            )
+        store = CPIStore()
+        if not len(store):
+            print(f"\nWarning: The CPI store ({store.path}) is empty - import a CPI table with `python cpi.py <file>`. "
+                  "Report will proceed without inflation stats.\n")
 
-            # return the values that correspond to the min/max of the df's date range
-            _cpi_starting_fetch = df.iloc[:, -1].loc[
-                (df['Year'] == str(start.year)) &
-                (df['Month'] == start.month)
-                ].iloc[0]
-
-            _cpi_ending_fetch = df.iloc[:, -1].loc[
-                (df['Year'] == str(end.year)) &
-                (df['Month'] == end.month)
-                ].iloc[0]
-
-            if math.isnan(float(_cpi_starting_fetch)) or math.isnan(float(_cpi_ending_fetch)):
-                print("\nWarning: Couldn't locate a valid CPI for this date range. "
-                      "Report will proceed assuming 0 inflation.\n")
-                RunSimulator.cpi_starting = float(0)
-                RunSimulator.cpi_ending = float(0)
-                return RunSimulator.cpi_starting, RunSimulator.cpi_ending
-
-            RunSimulator.cpi_starting = float(_cpi_starting_fetch)
-            RunSimulator.cpi_ending = float(_cpi_ending_fetch)
-            return RunSimulator.cpi_starting, RunSimulator.cpi_ending
-
-        except (ValueError, IndexError, TypeError):
-            RunSimulator.cpi_starting = float(0)
-            RunSimulator.cpi_ending = float(0)
-            return RunSimulator.cpi_starting, RunSimulator.cpi_ending
+        RunSimulator.cpi_starting, RunSimulator.cpi_ending = store.lookup_dates([start, end])
+        if len(store) and np.isnan([RunSimulator.cpi_starting, RunSimulator.cpi_ending]).any():
+            print("\nWarning: Couldn't locate a valid CPI for this date range in the CPI store. "
+                  "Report will proceed without inflation stats.\n")
 
-    @staticmethod
-    def inflation_rate() -> float:
-        """Returns the inflation rate based on starting and ending CPI, as defined in config.py"""
+        return RunSimulator.cpi_starting, RunSimulator.cpi_ending
+
+    def inflation_rate(self) -> float:
+        """Returns the inflation rate of this simulation, based on its starting and ending CPI"""
         try:
-            if RunSimulator.cpi_ending > 0 and RunSimulator.cpi_starting > 0:
-                return round(((RunSimulator.cpi_ending - RunSimulator.cpi_starting) / RunSimulator.cpi_starting)*100, 1)
-            else:
-                return 0
-        except (ImportError, TypeError, ZeroDivisionError):
+            return cpi_between(self.cpi_starting, self.cpi_ending)[()]
+        except (TypeError, ValueError):
             logging.exception("Please enter valid float values for the starting/ending CPI.")
             exit(1)
 
     @staticmethod
-    def correlation(df) -> Tuple[float, int]:
-        """Returns the slope and correlation of the two assets from the df created with the `DataImport` class"""
+    @profiled('correlation', rows=lambda result, df, *_: len(df))
+    def correlation_matrix(df, asset_names: Sequence[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Returns the correlation and slope matrices of every asset pair, from a single pass over the weekly price matrix.
+        slope[i][j] is the OLS slope of asset i regressed on asset j (how much i moves for every $1 move in j).
+        Each pair is measured over the weeks both assets have a price.
+
+        :param df: the DataFrame created with the `DataImport` class
+        :param asset_names: the assets to correlate - defaults to every '<asset> Close' column of the df
+        """
+        present, centered, asset_names = RunSimulator._centered_prices(df, asset_names)
+        mask = present.astype(float)
+
+        # every pairwise sum comes out of a few matrix products over the shared weeks of each pair: weeks missing a
+        # price for one asset only drop out of that asset's pairs
+        n_weeks = mask.T @ mask
+        sum_x = centered.T @ mask  # sum_x[i, j] = sum of asset i over the weeks it shares with asset j
+        sum_xx = (centered ** 2).T @ mask
+        sum_xy = centered.T @ centered
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = sum_xy - sum_x * sum_x.T / n_weeks
+            # variance[i, j] = variance of asset i over the weeks it shares with asset j
+            variance = sum_xx - sum_x ** 2 / n_weeks
+
+            correl = covariance / np.sqrt(variance * variance.T)
+            slope = covariance / variance.T
+
+        return (
+            pd.DataFrame(correl, index=asset_names, columns=asset_names),
+            pd.DataFrame(slope, index=asset_names, columns=asset_names)
+        )
+
+    @staticmethod
+    def _centered_prices(df, asset_names: Sequence[str] = None) -> Tuple[np.ndarray, np.ndarray, list]:
+        """
+        Returns the (n_weeks x n_assets) mask of the weeks with a price, the weekly prices centered on each asset's mean
+        (0 where missing) and the asset names - centering keeps the sums of squares small, so they don't lose precision.
+        """
+        if asset_names is None:
+            asset_names = [col[:-len(' Close')] for col in df.columns if col.endswith(' Close')]
+        asset_names = list(asset_names)
+
+        prices = df[[f'{asset} Close' for asset in asset_names]].to_numpy(dtype=float)
+        present = ~np.isnan(prices)
+        filled = np.where(present, prices, 0)
+        centered = np.where(present, filled - filled.sum(axis=0) / np.maximum(present.sum(axis=0), 1), 0)
+        return present, centered, asset_names
+
+    @staticmethod
+    @profiled('rolling correlation', rows=lambda result, df, *_: len(df))
+    def rolling_correlation(
+            df,
+            window: int = 52,
+            asset_names: Sequence[str] = None,
+            min_periods: int = None
+    ) -> pd.DataFrame:
+        """
+        Returns the correlation of every asset pair over a trailing window of weeks, for every week. The window sums
+        are differences of running (prefix) sums, so each step costs O(1) per pair however long the window is - same
+        values as `df[a].rolling(window).corr(df[b])`.
+
+        :param df: the DataFrame created with the `DataImport` class
+        :param window: the number of weeks in each window
+        :param asset_names: the assets to correlate - defaults to every '<asset> Close' column of the df
+        :param min_periods: the fewest shared weeks a window needs to get a value (defaults to the whole window)
+        :return: (pd.DataFrame) indexed by week, one '<asset> x <asset>' column per pair
+        """
+        present, centered, asset_names = RunSimulator._centered_prices(df, asset_names)
+        min_periods = window if min_periods is None else min_periods
+        first, second = np.triu_indices(len(asset_names), k=1)
+
+        def window_sums(values: np.ndarray) -> np.ndarray:
+            running = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+            starts = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+            return running[1:] - running[starts]
+
+        correl = np.empty((len(centered), len(first)))
+        # pairs are processed in blocks, so the temporaries stay small for universes of thousands of pairs
+        block_size = 1_000
+        for block in range(0, len(first), block_size):
+            i, j = first[block:block + block_size], second[block:block + block_size]
+
+            # (n_weeks x n_pairs) values of each pair, zeroed on the weeks the pair doesn't share
+            shared = (present[:, i] & present[:, j]).astype(float)
+            x = centered[:, i] * shared
+            y = centered[:, j] * shared
+
+            n_weeks = window_sums(shared)
+            sum_x, sum_y = window_sums(x), window_sums(y)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                covariance = window_sums(x * y) - sum_x * sum_y / n_weeks
+                variance_x = window_sums(x * x) - sum_x ** 2 / n_weeks
+                variance_y = window_sums(y * y) - sum_y ** 2 / n_weeks
+                correl[:, block:block + block_size] = np.where(
+                    n_weeks >= max(min_periods, 1), covariance / np.sqrt(variance_x * variance_y), np.nan
+                )
+
+        return pd.DataFrame(
+            correl,
+            index=pd.DatetimeIndex(df['Date'], name='Date'),
+            columns=[f'{asset_names[i]} x {asset_names[j]}' for i, j in zip(first, second)]
+        )
+
+    @staticmethod
+    def correlation(df, asset_names: Sequence[str] = None) -> Tuple[float, int]:
+        """
+        Returns the slope and correlation of the two assets from the df created with the `DataImport` class
+        (the asset pair in config.py, unless another pair is passed as `asset_names`)
+        """
         try:
-            asset1_weekly_price_column = df[f'{asset1_name} Close']
-            asset2_weekly_price_column = df[f'{asset2_name} Close']
+            correl_matrix, slope_matrix = RunSimulator.correlation_matrix(
+                df, asset_names if asset_names is not None else [asset1_name, asset2_name]
+            )
+
+            correl = correl_matrix.iloc[0, 1].round(2)
+            slope1 = slope_matrix.iloc[0, 1]
+            slope2 = slope_matrix.iloc[1, 0]
 
-            correl = asset1_weekly_price_column.corr(asset2_weekly_price_column).round(2)
-            slope1, intercept1 = (np.polyfit(asset2_weekly_price_column, asset1_weekly_price_column, 1))
-            slope2, intercept2 = (np.polyfit(asset1_weekly_price_column, asset2_weekly_price_column, 1))
+            if not (np.isfinite(slope1) and np.isfinite(slope2)):
+                raise np.linalg.LinAlgError
 
             return correl, int(slope1) if slope1 > slope2 else int(slope2)
 